@@ -1,7 +1,7 @@
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                             QHBoxLayout, QLabel, QComboBox, QCheckBox, QLineEdit, 
                             QPushButton, QTextEdit, QListWidget, QFrame)
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
+from PyQt6.QtCore import Qt, QThread, QTimer, pyqtSignal
 from PyQt6.QtGui import QPalette, QColor
 import pyaudio
 import numpy as np
@@ -10,15 +10,22 @@ import soundfile as sf
 import os
 import time
 import sys
+import threading
+import asyncio
 
 # 导入原有的模型和处理函数
-from STT_tk import (model_asr, model_vad, sv_pipeline, asr, speaker_verify, 
-                   format_str_v3, reg_spk_init)
+from STT_tk import models, embed_speakers, create_recognizer
+from streaming import StreamEvent
+from postprocess import format_str_v3
+from speaker_index import SpeakerRegistry
+from transcript import TranscriptModel
 
 # 音频参数
 CHUNK_SIZE_MS = 100
 SAMPLE_RATE = 16000
 CHUNK_SIZE = int(CHUNK_SIZE_MS * SAMPLE_RATE / 1000)
+MAX_TRANSCRIPT_LINES = 2000  # 结果框最多保留的行数
+RENDER_FPS = 10  # 结果框和字幕每秒最多刷新次数
 FORMAT = pyaudio.paInt16
 CHANNELS = 1
 
@@ -172,12 +179,12 @@ class SubtitleWindow(QWidget):
 class AudioThread(QThread):
     text_ready = pyqtSignal(str)
     
-    def __init__(self, device_index, language, sv_enabled, selected_speakers):
+    def __init__(self, device_index, language, sv_enabled, speakers):
         super().__init__()
         self.device_index = device_index
         self.language = language
         self.sv_enabled = sv_enabled
-        self.selected_speakers = selected_speakers
+        self.speakers = speakers
         self.running = False
         
     def run(self):
@@ -193,73 +200,25 @@ class AudioThread(QThread):
             frames_per_buffer=CHUNK_SIZE
         )
         
-        audio_vad = np.array([], dtype=np.float32)
-        cache = {}
-        cache_asr = {}
-        offset = 0
-        last_vad_beg = last_vad_end = -1
-        hit = False
-        spk = 'unknown'
-        
         try:
-            while self.running:
-                data = stream.read(CHUNK_SIZE, exception_on_overflow=False)
-                chunk = np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32767.0
-                audio_vad = np.append(audio_vad, chunk)
-
-                if last_vad_beg > 1:
-                    if self.sv_enabled:
-                        if not hit:
-                            hit, speaker = speaker_verify(
-                                audio_vad[int((last_vad_beg - offset) * SAMPLE_RATE / 1000):],
-                                0.3,
-                                reg_spks=reg_spk_init(self.selected_speakers)
-                            )
-                            if hit:
-                                spk = speaker
-                            else:
-                                spk = 'unknown'
-
-                vad_result = model_vad.generate(
-                    input=chunk, 
-                    cache=cache, 
-                    is_final=False, 
-                    chunk_size=CHUNK_SIZE_MS
-                )
-                
-                if len(vad_result[0]["value"]):
-                    vad_segments = vad_result[0]["value"]
-                    for segment in vad_segments:
-                        if segment[0] > -1:
-                            last_vad_beg = segment[0]
-                        if segment[1] > -1:
-                            last_vad_end = segment[1]
-                        if last_vad_beg > -1 and last_vad_end > -1:
-                            last_vad_beg -= offset
-                            last_vad_end -= offset
-                            offset += last_vad_end
-                            beg = int(last_vad_beg * SAMPLE_RATE / 1000)
-                            end = int(last_vad_end * SAMPLE_RATE / 1000)
-
-                            result = asr(
-                                input=audio_vad[beg:end],
-                                cache=cache_asr,
-                                lang=self.language,
-                                use_itn=True
-                            )
-                            
-                            audio_vad = audio_vad[end:]
-                            last_vad_beg = last_vad_end = -1
-                            hit = False
-
-                            if result is not None:
-                                self.text_ready.emit(f"{spk}: {format_str_v3(result[0]['text'])}")
-                            
+            asyncio.run(self.recognize(stream))
         finally:
             stream.stop_stream()
             stream.close()
             audio_interface.terminate()
 
+    async def recognize(self, stream):
+        # 识别循环与服务端共用 StreamingRecognizer，这里只负责读麦克风和发出结果
+        engine = create_recognizer(self.language, self.sv_enabled, 0.3, self.speakers, CHUNK_SIZE_MS)
+        try:
+            while self.running:
+                engine.append_pcm(stream.read(CHUNK_SIZE, exception_on_overflow=False))
+                async for event in engine.process():
+                    if event.kind == StreamEvent.FINAL and event.result is not None:
+                        self.text_ready.emit(f"{event.speaker}: {format_str_v3(event.result['text'])}")
+        finally:
+            engine.close()
+
     def stop(self):
         self.running = False
 
@@ -315,8 +274,17 @@ class MainWindow(QMainWindow):
         # 初始化音频接口
         self.audio_interface = pyaudio.PyAudio()
         self.audio_thread = None
+        # 说话人索引按识别会话在后台加载
+        self.speakers = SpeakerRegistry(embed_speakers)
+        # 后台预热 VAD 和 ASR 模型
+        threading.Thread(target=models.warmup, args=(("vad", "asr"),), daemon=True).start()
         
+        # 结果先写入 transcript，再由定时器按固定帧率批量显示
+        self.transcript = TranscriptModel(MAX_TRANSCRIPT_LINES, fps=RENDER_FPS)
         self.init_ui()
+        self.render_timer = QTimer(self)
+        self.render_timer.timeout.connect(self.render_transcript)
+        self.render_timer.start(self.transcript.interval_ms)
         
     def init_ui(self):
         central_widget = QWidget()
@@ -419,6 +387,8 @@ class MainWindow(QMainWindow):
         self.result_text = QTextEdit()
         self.result_text.setReadOnly(True)
         self.result_text.setMinimumHeight(200)
+        # 超出的最早几行由 Qt 自动丢弃
+        self.result_text.document().setMaximumBlockCount(MAX_TRANSCRIPT_LINES)
         layout.addWidget(self.result_text)
         
         # 添加录制按钮的点击事件连接
@@ -456,6 +426,9 @@ class MainWindow(QMainWindow):
         self.record_btn.setEnabled(True)
         self.update_sv_speakers()
         self.log_message(f"录制完成: {filename}")
+        # 识别进行中时新录制的说话人直接加入当前会话
+        if self.audio_thread and self.audio_thread.isRunning() and self.audio_thread.sv_enabled:
+            self.speakers.add(filename)
         
     def start_recognition(self):
         device_index = self.mic_combo.currentIndex()
@@ -467,12 +440,14 @@ class MainWindow(QMainWindow):
         
         selected_speakers = ["speaker/"+item.text() for item in 
                            self.sv_list.selectedItems()]
+        if self.sv_checkbox.isChecked():
+            self.speakers.load(selected_speakers)
         
         self.audio_thread = AudioThread(
             device_index,
             self.lang_combo.currentText(),
             self.sv_checkbox.isChecked(),
-            selected_speakers
+            self.speakers
         )
         self.audio_thread.text_ready.connect(self.log_message)
         self.audio_thread.start()
@@ -498,19 +473,21 @@ class MainWindow(QMainWindow):
                 screen.width() // 2,
                 screen.height() // 6
             )
+            self.subtitle_window.update_text('\n'.join(self.transcript.recent_lines()))
             self.subtitle_window.show()
             self.subtitle_btn.setText("隐藏字幕")
         
     def log_message(self, message):
-        self.result_text.append(message)
-        # 更新字幕窗口
+        self.transcript.append(message)
+
+    def render_transcript(self):
+        lines, recent = self.transcript.drain()
+        if lines is None:
+            return
+        self.result_text.append('\n'.join(lines))
+        # 更新字幕窗口，只显示最后几行
         if self.subtitle_window.isVisible():
-            # 只显示最后几行
-            lines = self.result_text.toPlainText().split('\n')
-            if len(lines) > 3:
-                self.subtitle_window.update_text('\n'.join(lines[-3:]))
-            else:
-                self.subtitle_window.update_text(message)
+            self.subtitle_window.update_text('\n'.join(recent))
         
     def closeEvent(self, event):
         self.subtitle_window.close()
@@ -1,19 +1,24 @@
 import tkinter as tk
 from tkinter import ttk
 import threading
+import asyncio
 import pyaudio
 import numpy as np
 from loguru import logger
-from funasr import AutoModel
-from modelscope.pipelines import pipeline
 import soundfile as sf
+from speaker_index import SpeakerIndex, SpeakerRegistry, extract_embeddings
+from config import Config
+from models import ModelRegistry
+from segmentation import SegmentationPolicy
+from streaming import StreamingRecognizer, StreamEvent
+from postprocess import format_str_v3
+from transcript import TranscriptModel
 import os
 import time
 
 # 初始化日志
 logger.remove()
 logger.add(lambda msg: None)  # 禁用日志输出到控制台
-from modelscope.utils.constant import Tasks
 
 # 配置音频参数
 CHUNK_SIZE_MS = 300
@@ -21,176 +26,28 @@ SAMPLE_RATE = 16000
 CHUNK_SIZE = int(CHUNK_SIZE_MS * SAMPLE_RATE / 1000)
 FORMAT = pyaudio.paInt16
 CHANNELS = 1
+MAX_TRANSCRIPT_LINES = 2000  # 结果框最多保留的行数
+RENDER_FPS = 10  # 结果框每秒最多刷新次数
 
-emo_dict = {
-	"<|HAPPY|>": "😊",
-	"<|SAD|>": "😔",
-	"<|ANGRY|>": "😡",
-	"<|NEUTRAL|>": "",
-	"<|FEARFUL|>": "😰",
-	"<|DISGUSTED|>": "🤢",
-	"<|SURPRISED|>": "😮",
-}
-
-event_dict = {
-	"<|BGM|>": "🎼",
-	"<|Speech|>": "",
-	"<|Applause|>": "👏",
-	"<|Laughter|>": "😀",
-	"<|Cry|>": "😭",
-	"<|Sneeze|>": "🤧",
-	"<|Breath|>": "",
-	"<|Cough|>": "🤧",
-}
-
-emoji_dict = {
-	"<|nospeech|><|Event_UNK|>": "❓",
-	"<|zh|>": "",
-	"<|en|>": "",
-	"<|yue|>": "",
-	"<|ja|>": "",
-	"<|ko|>": "",
-	"<|nospeech|>": "",
-	"<|HAPPY|>": "😊",
-	"<|SAD|>": "😔",
-	"<|ANGRY|>": "😡",
-	"<|NEUTRAL|>": "",
-	"<|BGM|>": "🎼",
-	"<|Speech|>": "",
-	"<|Applause|>": "👏",
-	"<|Laughter|>": "😀",
-	"<|FEARFUL|>": "😰",
-	"<|DISGUSTED|>": "🤢",
-	"<|SURPRISED|>": "😮",
-	"<|Cry|>": "😭",
-	"<|EMO_UNKNOWN|>": "",
-	"<|Sneeze|>": "🤧",
-	"<|Breath|>": "",
-	"<|Cough|>": "😷",
-	"<|Sing|>": "",
-	"<|Speech_Noise|>": "",
-	"<|withitn|>": "",
-	"<|woitn|>": "",
-	"<|GBG|>": "",
-	"<|Event_UNK|>": "",
-}
-
-lang_dict =  {
-    "<|zh|>": "<|lang|>",
-    "<|en|>": "<|lang|>",
-    "<|yue|>": "<|lang|>",
-    "<|ja|>": "<|lang|>",
-    "<|ko|>": "<|lang|>",
-    "<|nospeech|>": "<|lang|>",
-}
-
-emo_set = {"😊", "😔", "😡", "😰", "🤢", "😮"}
-event_set = {"🎼", "👏", "😀", "😭", "🤧", "😷",}
-
-def format_str(s):
-	for sptk in emoji_dict:
-		s = s.replace(sptk, emoji_dict[sptk])
-	return s
-
-
-def format_str_v2(s):
-	sptk_dict = {}
-	for sptk in emoji_dict:
-		sptk_dict[sptk] = s.count(sptk)
-		s = s.replace(sptk, "")
-	emo = "<|NEUTRAL|>"
-	for e in emo_dict:
-		if sptk_dict[e] > sptk_dict[emo]:
-			emo = e
-	for e in event_dict:
-		if sptk_dict[e] > 0:
-			s = event_dict[e] + s
-	s = s + emo_dict[emo]
-
-	for emoji in emo_set.union(event_set):
-		s = s.replace(" " + emoji, emoji)
-		s = s.replace(emoji + " ", emoji)
-	return s.strip()
-
-def format_str_v3(s):
-	def get_emo(s):
-		return s[-1] if s[-1] in emo_set else None
-	def get_event(s):
-		return s[0] if s[0] in event_set else None
-
-	s = s.replace("<|nospeech|><|Event_UNK|>", "❓")
-	for lang in lang_dict:
-		s = s.replace(lang, "<|lang|>")
-	s_list = [format_str_v2(s_i).strip(" ") for s_i in s.split("<|lang|>")]
-	new_s = " " + s_list[0]
-	cur_ent_event = get_event(new_s)
-	for i in range(1, len(s_list)):
-		if len(s_list[i]) == 0:
-			continue
-		if get_event(s_list[i]) == cur_ent_event and get_event(s_list[i]) != None:
-			s_list[i] = s_list[i][1:]
-		#else:
-		cur_ent_event = get_event(s_list[i])
-		if get_emo(s_list[i]) != None and get_emo(s_list[i]) == get_emo(new_s):
-			new_s = new_s[:-1]
-		new_s += s_list[i].strip().lstrip()
-	new_s = new_s.replace("The.", " ")
-	return new_s.strip()
-
-
-# 初始化模型
-sv_pipeline = pipeline(
-    task='speaker-verification',
-    model='iic/speech_eres2net_large_sv_zh-cn_3dspeaker_16k',
-    model_revision='v1.0.0',
-)
-
-asr_pipeline = pipeline(
-    task=Tasks.auto_speech_recognition,
-    model='iic/SenseVoiceSmall',
-    model_revision="master",
-    disable_update=True
-)
-
-model_asr = AutoModel(
-    model="iic/SenseVoiceSmall",
-    trust_remote_code=True,
-    disable_update=True,
-    device="cuda:0"
-)
-model_vad = AutoModel(
-    model="fsmn-vad",
-    model_revision="v2.0.4",
-    disable_pbar=True,
-    max_end_silence_time=500,
-    disable_update=True,
-    device="cuda:0"
-)
+# 初始化模型：首次使用时才加载，未用到的模型（如未启用说话人验证时的 SV）不会加载
+config = Config()
+models = ModelRegistry(config)
+segmentation = SegmentationPolicy.from_config(config, SAMPLE_RATE)
+
+def embed_speakers(audios):
+    return extract_embeddings(models.sv, audios)
 def reg_spk_init(files):
-    reg_spk = {}
-    for f in files:
-        data, sr = sf.read(f, dtype="float32")
-        k, _ = os.path.splitext(os.path.basename(f))
-        reg_spk[k] = {
-            "data": data,
-            "sr":   sr,
-        }
-    return reg_spk
-def speaker_verify(audio, sv_thr, reg_spks):
-    hit = False
-    for k, v in reg_spks.items():
-        res_sv = sv_pipeline([audio, v["data"]], sv_thr)
-        if res_sv["score"] >= sv_thr:
-           hit = True
-        logger.info(f"[speaker_verify] audio_len: {len(audio)}; sv_thr: {sv_thr}; hit: {hit}; {k}: {res_sv}")
+    return SpeakerIndex.load_or_build(files, embed_speakers)
+def match_speaker(emb, sv_thr, reg_spks):
+    k, score = reg_spks.match(emb)
+    hit = score >= sv_thr
+    logger.info(f"[speaker_verify] sv_thr: {sv_thr}; hit: {hit}; {k}: {score:.5f}")
     return hit, k
-
 def asr(input, lang, cache, use_itn=False):
     # with open('test.pcm', 'ab') as f:
     #     logger.debug(f'write {f.write(audio)} bytes to `test.pcm`')
-    # result = asr_pipeline(audio, lang)
     start_time = time.time()
-    result = model_asr.generate(
+    result = models.asr.generate(
         input           = input,
         cache           = cache,
         language        = lang.strip(),
@@ -201,6 +58,20 @@ def asr(input, lang, cache, use_itn=False):
     elapsed_time = end_time - start_time
     logger.debug(f"asr elapsed: {elapsed_time * 1000:.2f} milliseconds")
     return result
+def create_recognizer(language, sv, sv_thr, speakers, chunk_size_ms):
+    """单路麦克风的流式识别器；`speakers` 为 SpeakerRegistry，SV 只在启用时运行"""
+    cache_asr = {}
+    return StreamingRecognizer.from_config(
+        config,
+        vad=lambda chunk, cache: models.vad.generate(input=chunk, cache=cache, is_final=False, chunk_size=chunk_size_ms),
+        asr=lambda samples: asr(input=samples, cache=cache_asr, lang=language, use_itn=True)[0],
+        embed=(lambda samples: embed_speakers([samples])[0]) if sv else None,
+        match=lambda emb: match_speaker(emb, sv_thr, speakers.index),
+        has_speakers=lambda: len(speakers.index) > 0,  # 说话人尚未加载完成时不验证
+        sample_rate=SAMPLE_RATE,
+        chunk_size_ms=chunk_size_ms,
+        segmentation=segmentation,
+    )
 class SpeechRecognizerApp:
     def __init__(self, root):
         self.root = root
@@ -216,7 +87,14 @@ class SpeechRecognizerApp:
         self.selected_device_index = None
         self.reg_spks_files = []
         self.selected_speakers = []
+        # 每次识别会话的说话人在后台线程加载，识别循环只读取内存中的索引
+        self.speakers = SpeakerRegistry(embed_speakers)
+        # 后台预热 VAD 和 ASR 模型，避免第一次识别时的冷启动延迟
+        threading.Thread(target=models.warmup, args=(("vad", "asr"),), daemon=True).start()
+        # 结果先写入 transcript（任意线程），再由界面线程按固定帧率批量显示
+        self.transcript = TranscriptModel(MAX_TRANSCRIPT_LINES, fps=RENDER_FPS)
         self.create_widgets()
+        self.render_transcript()
 
     def create_widgets(self):
         # 语言选择
@@ -322,6 +200,8 @@ class SpeechRecognizerApp:
             file.write(np.frombuffer(b"".join(frames), dtype=np.int16).astype(np.float32) / 32767.0)
 
         self.log_result(f"录制完成，文件保存为 {filename}")
+        if self.running and self.sv:
+            self.speakers.add(filename)
         self.update_sv_speakers()
 
     def start_recognition(self):
@@ -336,6 +216,8 @@ class SpeechRecognizerApp:
         self.language = self.language_var.get()
         self.selected_speakers = ["speaker/"+self.sv_speakers_menu.get(i) for i in self.sv_speakers_menu.curselection()]
         self.log_result(f"选定的说话人验证文件: {self.selected_speakers}")
+        if self.sv:
+            self.speakers.load(self.selected_speakers)
         self.thread = threading.Thread(target=self.process_audio_stream)
         self.thread.daemon = True
         self.thread.start()
@@ -354,62 +236,9 @@ class SpeechRecognizerApp:
             input_device_index=self.selected_device_index,
             frames_per_buffer=CHUNK_SIZE
         )
-        audio_vad = np.array([], dtype=np.float32)
-        cache = {}
-        cache_asr = {}
-        offset = 0
-        last_vad_beg = last_vad_end = -1
-        hit = False
         self.log_result("开始语音识别...")
-
         try:
-            while self.running:
-                data = stream.read(CHUNK_SIZE, exception_on_overflow=False)
-                chunk = np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32767.0
-                audio_vad = np.append(audio_vad, chunk)
-
-                if last_vad_beg > 1:
-                    if self.sv:
-                        if not hit:
-                            hit, speaker = speaker_verify(audio_vad[int((last_vad_beg - offset) * SAMPLE_RATE / 1000):],
-                                                          self.sv_threshold,reg_spks=reg_spk_init(self.selected_speakers))
-                            if hit:
-                                spk = speaker
-                            else:
-                                spk = 'unknown'
-                # 使用 VAD 检测语音段
-                vad_result = model_vad.generate(input=chunk, cache=cache, is_final=False, chunk_size=CHUNK_SIZE_MS)
-                if len(vad_result[0]["value"]):
-                    vad_segments = vad_result[0]["value"]
-                    for segment in vad_segments:
-                        if segment[0] > -1:  # Speech begin
-                            last_vad_beg = segment[0]
-                        if segment[1] > -1:  # Speech end
-                            last_vad_end = segment[1]
-                        if last_vad_beg > -1 and last_vad_end > -1:
-                            last_vad_beg -= offset
-                            last_vad_end -= offset
-                            offset += last_vad_end
-                            beg = int(last_vad_beg * SAMPLE_RATE / 1000)
-                            end = int(last_vad_end * SAMPLE_RATE / 1000)
-                            logger.info(f"[vad segment] audio_len: {end - beg}")
-
-                            result = asr(
-                                input=audio_vad[beg:end],
-                                cache=cache_asr,
-                                lang=self.language,
-                                use_itn=True
-                            )
-                            logger.info(f"asr response: {result}")
-                            audio_vad = audio_vad[end:]
-                            last_vad_beg = last_vad_end = -1
-                            hit = False
-
-                            if result is not None:
-                                self.log_result(f"{spk}: {format_str_v3(result[0]['text'])}")
-                            else:
-                                self.log_result("忽略。")
-
+            asyncio.run(self.recognize(stream))
         except Exception as e:
             self.log_result(f"错误: {str(e)}")
         finally:
@@ -417,9 +246,36 @@ class SpeechRecognizerApp:
             stream.close()
             self.log_result("语音识别已停止。")
 
+    async def recognize(self, stream):
+        # 识别循环与服务端共用 StreamingRecognizer，这里只负责读麦克风和显示结果
+        engine = create_recognizer(self.language, self.sv, self.sv_threshold, self.speakers, CHUNK_SIZE_MS)
+        try:
+            while self.running:
+                engine.append_pcm(stream.read(CHUNK_SIZE, exception_on_overflow=False))
+                async for event in engine.process():
+                    if event.kind != StreamEvent.FINAL:
+                        continue
+                    if event.result is not None:
+                        self.log_result(f"{event.speaker}: {format_str_v3(event.result['text'])}")
+                    else:
+                        self.log_result("忽略。")
+        finally:
+            engine.close()
+
     def log_result(self, text):
-        self.result_text.insert(tk.END, text + "\n")
-        self.result_text.see(tk.END)
+        # 可在识别线程中调用，不直接操作 Tk 控件
+        self.transcript.append(text)
+
+    def render_transcript(self):
+        lines, _ = self.transcript.drain()
+        if lines:
+            self.result_text.insert(tk.END, "\n".join(lines) + "\n")
+            # 只保留最后 MAX_TRANSCRIPT_LINES 行，长时间运行时控件不会越来越慢
+            excess = int(self.result_text.index("end-1c").split(".")[0]) - 1 - MAX_TRANSCRIPT_LINES
+            if excess > 0:
+                self.result_text.delete("1.0", f"{excess + 1}.0")
+            self.result_text.see(tk.END)
+        self.root.after(self.transcript.interval_ms, self.render_transcript)
 
 # 启动应用
 if __name__ == "__main__":
@@ -0,0 +1,83 @@
+from loguru import logger
+
+# Load levels, in the order optional work is shed.
+NORMAL, SHED_SV, SHED_PARTIALS, SATURATED = range(4)
+LEVEL_NAMES = ("normal", "shed_sv", "shed_partials", "saturated")
+
+
+class SessionOverloaded(Exception):
+    """A session has more received audio waiting than it may buffer."""
+
+
+class AdmissionController:
+    """Session limits and load shedding for the streaming server.
+
+    The load level follows the seconds of audio queued for ASR across
+    all sessions (`backlog_s()`). As it grows past `shed_sv_s`,
+    `shed_partials_s` and `saturated_s`, speaker verification is skipped,
+    then interim results are dropped, then new sessions and uploads are
+    refused. Sessions are also refused once `max_sessions` are open.
+    A limit of 0 disables it. Every decision is counted in `shed` and
+    `rejected` and level changes are logged.
+    """
+
+    def __init__(self, backlog_s, max_sessions=0, shed_sv_s=0, shed_partials_s=0, saturated_s=0, retry_after_s=5):
+        self.backlog_s = backlog_s
+        self.max_sessions = max_sessions
+        self.thresholds = (shed_sv_s, shed_partials_s, saturated_s)
+        self.retry_after_s = retry_after_s
+        self.sessions = 0
+        self.shed = {"sv": 0, "partial": 0}
+        self.rejected = {"sessions": 0, "saturated": 0}
+        self._level = NORMAL
+
+    @classmethod
+    def from_config(cls, config, backlog_s):
+        return cls(backlog_s, config.max_sessions, config.shed_sv_backlog_s, config.shed_partials_backlog_s,
+                   config.saturated_backlog_s, config.retry_after_s)
+
+    def level(self):
+        backlog = self.backlog_s()
+        level = NORMAL
+        for i, threshold in enumerate(self.thresholds):
+            if threshold and backlog >= threshold:
+                level = i + 1
+        if level != self._level:
+            log = logger.warning if level > self._level else logger.info
+            log(f"[admission] load level {LEVEL_NAMES[self._level]} -> {LEVEL_NAMES[level]}; "
+                f"asr backlog: {backlog:.1f}s; sessions: {self.sessions}")
+            self._level = level
+        return level
+
+    def admit(self):
+        """Take a session slot; returns the refusal reason, or None."""
+        if self.max_sessions and self.sessions >= self.max_sessions:
+            reason = "sessions"
+        elif self.level() >= SATURATED:
+            reason = "saturated"
+        else:
+            self.sessions += 1
+            return None
+        self.rejected[reason] += 1
+        return reason
+
+    def release(self):
+        self.sessions -= 1
+
+    def saturated(self):
+        if self.level() >= SATURATED:
+            self.rejected["saturated"] += 1
+            return True
+        return False
+
+    def shed_sv(self):
+        if self.level() >= SHED_SV:
+            self.shed["sv"] += 1
+            return True
+        return False
+
+    def shed_partials(self):
+        if self.level() >= SHED_PARTIALS:
+            self.shed["partial"] += 1
+            return True
+        return False
@@ -0,0 +1,160 @@
+from bisect import bisect_right
+
+import numpy as np
+
+
+class AudioRingBuffer:
+    """Growable int16 audio store addressed by absolute sample index.
+
+    Samples are appended at the tail and released from the head with
+    `discard_until`. Live samples are always kept contiguous, so `view`
+    returns a slice of the backing array instead of a copy; the backing
+    array is only compacted (or doubled) when the tail hits its end.
+    Conversion to float32 happens in `float32`, at the model boundary.
+    """
+
+    def __init__(self, capacity=16000 * 30):
+        self._buf = np.zeros(max(int(capacity), 1), dtype=np.int16)
+        self._head = 0      # position of `start` in `_buf`
+        self._start = 0     # absolute index of the oldest retained sample
+        self._end = 0       # absolute index one past the newest sample
+        self._bytes = self._buf.view(np.uint8)
+        self._carry = 0     # odd trailing byte of the last `append_pcm` packet
+        self._odd = 0
+
+    @property
+    def start(self):
+        return self._start
+
+    @property
+    def end(self):
+        return self._end
+
+    def __len__(self):
+        return self._end - self._start
+
+    def append(self, samples):
+        """Append int16 samples (array or raw little-endian PCM bytes)."""
+        if not isinstance(samples, np.ndarray):
+            samples = np.frombuffer(samples, dtype=np.int16)
+        n = len(samples)
+        if n == 0:
+            return
+        tail = self._grow(n)
+        self._buf[tail:tail + n] = samples
+        self._end += n
+
+    def append_pcm(self, data):
+        """Append a raw little-endian int16 packet of any length.
+
+        A trailing odd byte is carried over to the next packet. The
+        packet is copied once, byte-wise, straight into the store.
+        """
+        if not data:
+            return
+        odd = self._odd
+        total = odd + len(data)
+        n = total >> 1
+        if n:
+            pos = 2 * self._grow(n)
+            if odd:
+                self._bytes[pos] = self._carry
+            self._bytes[pos + odd:pos + 2 * n] = np.frombuffer(data, dtype=np.uint8, count=2 * n - odd)
+            self._end += n
+        self._odd = total & 1
+        if self._odd:
+            self._carry = data[-1]
+
+    def _grow(self, n):
+        # where the next `n` samples go in `_buf`
+        size = len(self)
+        if self._head + size + n > len(self._buf):
+            self._reserve(size + n)
+        return self._head + size
+
+    def _reserve(self, needed):
+        # Move live samples back to the front; grow only when less than
+        # half of the backing array would be free afterwards, so the
+        # compaction cost is amortised over the samples appended since.
+        size = len(self)
+        capacity = len(self._buf)
+        while needed * 2 > capacity:
+            capacity *= 2
+        if capacity != len(self._buf):
+            buf = np.empty(capacity, dtype=np.int16)
+            buf[:size] = self._buf[self._head:self._head + size]
+            self._buf = buf
+            self._bytes = buf.view(np.uint8)
+        elif size:
+            self._buf[:size] = self._buf[self._head:self._head + size]
+        self._head = 0
+
+    def _clamp(self, beg, end):
+        beg = min(max(int(beg), self._start), self._end)
+        end = self._end if end is None else min(max(int(end), beg), self._end)
+        return beg, end
+
+    def view(self, beg, end=None):
+        """Return int16 samples [beg, end) without copying.
+
+        Indices are absolute and clamped to the retained range. The view
+        is only valid until the next `append`.
+        """
+        beg, end = self._clamp(beg, end)
+        return self._buf[self._head + beg - self._start:self._head + end - self._start]
+
+    def float32(self, beg, end=None, out=None):
+        """Return samples [beg, end) scaled to float32 in [-1, 1]."""
+        samples = self.view(beg, end)
+        if out is None:
+            out = np.empty(len(samples), dtype=np.float32)
+        else:
+            out = out[:len(samples)]
+        np.divide(samples, np.float32(32767.0), out=out, casting="unsafe")
+        return out
+
+    def discard_until(self, index):
+        """Release every sample before absolute `index`."""
+        index = min(max(int(index), self._start), self._end)
+        self._head += index - self._start
+        self._start = index
+        if self._start == self._end:
+            self._head = 0
+
+    def clear(self):
+        self._head = 0
+        self._start = self._end
+
+
+class GapMap:
+    """Silence a client left out of its stream instead of sending it.
+
+    Received samples form one contiguous timeline, which is what the VAD
+    and `AudioRingBuffer` index. A gap of `samples` recorded at received
+    position `pos` means the sender skipped that much audio there;
+    `to_stream` maps a received position back onto the sender's clock.
+    """
+
+    def __init__(self):
+        self.total = 0      # samples skipped so far
+        self._base = 0      # skipped before the oldest position still kept
+        self._pos = []
+        self._cum = []      # `total` after each gap in `_pos`
+
+    def add(self, pos, samples, forget_before=0):
+        """Record a gap at `pos`; positions before `forget_before` will
+        not be mapped again and are folded into one offset."""
+        self.total += samples
+        drop = bisect_right(self._pos, forget_before - 1)
+        if drop:
+            self._base = self._cum[drop - 1]
+            del self._pos[:drop], self._cum[:drop]
+        if self._pos and self._pos[-1] == pos:
+            self._cum[-1] = self.total
+        else:
+            self._pos.append(pos)
+            self._cum.append(self.total)
+
+    def to_stream(self, pos):
+        i = bisect_right(self._pos, pos)
+        return pos + (self._cum[i - 1] if i else self._base)
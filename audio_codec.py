@@ -0,0 +1,49 @@
+import io
+
+import numpy as np
+
+# Codecs a WebSocket client can send audio in (`?codec=`).
+#   pcm   raw little-endian int16 at `sample_rate`, any packet size
+#   flac  every message is a complete FLAC file (lossless, ~70% of pcm)
+#   ogg   every message is a complete Ogg/Opus file (~40-65 kbit/s at
+#         200-500 ms packets, vs 256 kbit/s for pcm)
+# libsndfile cannot resume a stream after running out of input, so
+# compressed audio travels as self-contained packets of `packet_ms` each;
+# longer packets spend less on per-file headers but add latency.
+CODECS = ("pcm", "flac", "ogg")
+
+_FORMATS = {"flac": ("FLAC", "PCM_16"), "ogg": ("OGG", "OPUS")}
+
+
+class AudioDecodeError(ValueError):
+    pass
+
+
+def encode_packet(samples, codec, sample_rate=16000):
+    """Encode mono int16 `samples` as one message of `codec`."""
+    samples = np.asarray(samples, dtype=np.int16)
+    if codec == "pcm":
+        return samples.tobytes()
+    import soundfile as sf
+
+    fmt, subtype = _FORMATS[codec]
+    out = io.BytesIO()
+    sf.write(out, samples, sample_rate, format=fmt, subtype=subtype)
+    return out.getvalue()
+
+
+def decode_packet(data, codec, sample_rate=16000):
+    """Decode one `codec` message into mono int16 samples at `sample_rate`."""
+    import soundfile as sf
+
+    if not data.startswith(b"fLaC" if codec == "flac" else b"OggS"):
+        raise AudioDecodeError(f"not a {codec} packet")
+    try:
+        samples, sr = sf.read(io.BytesIO(data), dtype="int16", always_2d=True)
+    except (sf.LibsndfileError, RuntimeError, TypeError) as e:
+        raise AudioDecodeError(f"cannot decode {codec} packet: {getattr(e, 'error_string', e)}") from None
+    if sr != sample_rate:
+        raise AudioDecodeError(f"{codec} packet is {sr} Hz, expected {sample_rate} Hz")
+    if samples.shape[1] > 1:
+        return samples.mean(axis=1).astype(np.int16)
+    return samples[:, 0]
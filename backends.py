@@ -0,0 +1,114 @@
+import copy
+
+import numpy as np
+from loguru import logger
+
+# torch-cuda: funasr/modelscope on `Config.device`
+# torch-cpu:  the same models on CPU, SenseVoice with int8 dynamic quantization
+# onnx:       ONNX Runtime graphs of SenseVoiceSmall and fsmn-vad (funasr_onnx,
+#             exported and int8-quantized on first use); SV runs on torch-cpu
+BACKENDS = ("torch-cuda", "torch-cpu", "onnx")
+
+
+def torch_device(config):
+    return config.device if config.backend == "torch-cuda" else "cpu"
+
+
+def set_torch_threads(intra_threads, inter_threads):
+    """Apply the configured torch thread counts; 0 keeps the default."""
+    import torch
+
+    if intra_threads:
+        torch.set_num_threads(intra_threads)
+    if inter_threads:
+        try:
+            torch.set_num_interop_threads(inter_threads)
+        except RuntimeError as e:
+            # only allowed before the first inter-op parallel region ran
+            logger.warning(f"[backends] inter-op threads unchanged: {e}")
+
+
+def quantize_dynamic(model):
+    """int8 weights for every Linear layer, activations quantized on the fly."""
+    import torch
+
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def merge_segments(value):
+    # streaming output splits a segment into [beg, -1] ... [-1, end]
+    merged, beg = [], -1
+    for b, e in value:
+        if b > -1:
+            beg = b
+        if e > -1:
+            merged.append([beg, e])
+            beg = -1
+    return merged
+
+
+class OnnxSenseVoice:
+    """SenseVoiceSmall on ONNX Runtime behind the AutoModel.generate call
+    used by the front ends."""
+
+    def __init__(self, config):
+        from funasr_onnx import SenseVoiceSmall
+
+        self.model = SenseVoiceSmall(
+            config.asr_model,
+            batch_size=config.onnx_batch_size,
+            quantize=config.quantize,
+            intra_op_num_threads=config.intra_op_threads or 4,
+        )
+
+    def generate(self, input, language="auto", use_itn=False, **kwargs):
+        audios = input if isinstance(input, list) else [input]
+        textnorm = "withitn" if use_itn else "woitn"
+        # funasr_onnx reads every element of a list as a file path, so
+        # in-memory audio goes in one ndarray per call
+        texts = []
+        for audio in audios:
+            texts += self.model(np.asarray(audio, dtype=np.float32), language=language, textnorm=textnorm)
+        return [{"key": f"onnx_{i}", "text": text} for i, text in enumerate(texts)]
+
+
+class OnnxStreamingVad:
+    """fsmn-vad on ONNX Runtime behind the AutoModel.generate call.
+
+    funasr_onnx keeps the streaming state (frontend, scorer) on the model
+    object, so every stream gets a shallow copy with its own state that
+    shares the ONNX Runtime session. The copy lives in the caller's
+    `cache` dict like funasr's own streaming state.
+    """
+
+    def __init__(self, config):
+        from funasr_onnx import Fsmn_vad_online
+
+        self.model = Fsmn_vad_online(
+            config.onnx_vad_model,
+            quantize=config.quantize,
+            intra_op_num_threads=config.intra_op_threads or 4,
+            max_end_sil=config.max_end_silence_time,
+        )
+        self._frontend = copy.deepcopy(self.model.frontend)
+        self._scorer = copy.deepcopy(self.model.vad_scorer)
+
+    def _stream(self):
+        stream = copy.copy(self.model)
+        stream.frontend = copy.deepcopy(self._frontend)
+        stream.vad_scorer = copy.deepcopy(self._scorer)
+        return {"model": stream, "param_dict": {"in_cache": []}}
+
+    def generate(self, input, cache=None, is_final=True, **kwargs):
+        offline = cache is None
+        if offline:
+            cache = {}
+        state = cache.get("onnx")
+        if state is None:
+            state = cache["onnx"] = self._stream()
+        state["param_dict"]["is_final"] = is_final
+        segments = state["model"](audio_in=np.asarray(input, dtype=np.float32), param_dict=state["param_dict"])
+        value = [list(seg) for seg in segments[0]] if segments else []
+        if offline:
+            value = merge_segments(value)
+        return [{"key": "onnx", "value": value}]
@@ -0,0 +1,138 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+
+
+class MicroBatcher:
+    """Dynamic micro-batching of inference requests across sessions.
+
+    `submit` queues one audio segment and waits for its own result. A
+    collector task takes the first queued request, keeps collecting for
+    up to `max_wait_ms` or until `max_batch_s` seconds of audio are
+    pending, then calls `run_batch(key, audios)` once per distinct `key`
+    (e.g. language) in that window. `run_batch` returns one result per
+    input and runs on a pool of `workers` threads; a new batch is only
+    formed when a worker is free, so requests keep queueing (and batches
+    grow) while the pool is busy and the event loop is never blocked.
+    If a batch raises, its inputs are retried one by one, so the error
+    only reaches the request that caused it.
+    """
+
+    def __init__(self, run_batch, max_wait_ms=10, max_batch_s=60, sample_rate=16000, name="batch", workers=1):
+        self.run_batch = run_batch
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_samples = int(max_batch_s * sample_rate)
+        self.sample_rate = sample_rate
+        self.name = name
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._queue = None
+        self._task = None
+        self._carry = None
+        self._free = None
+        self._running = set()
+        self._pending = 0   # samples queued and not yet in a batch
+
+    def qsize(self):
+        return (self._queue.qsize() if self._queue is not None else 0) + (self._carry is not None)
+
+    def backlog_s(self):
+        """Seconds of audio queued and not yet in a batch."""
+        return self._pending / self.sample_rate
+
+    async def submit(self, audio, key=None):
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._free = asyncio.Semaphore(self.workers)
+            self._task = asyncio.create_task(self._collect())
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((key, audio, fut))
+        self._pending += len(audio)
+        return await fut
+
+    async def _next_batch(self):
+        loop = asyncio.get_running_loop()
+        if self._carry is not None:
+            first, self._carry = self._carry, None
+        else:
+            first = await self._queue.get()
+        batch = [first]
+        budget = len(first[1])
+        self._pending -= budget
+        deadline = loop.time() + self.max_wait
+        while budget < self.max_batch_samples:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if budget + len(item[1]) > self.max_batch_samples:
+                self._carry = item
+                break
+            batch.append(item)
+            budget += len(item[1])
+            self._pending -= len(item[1])
+        return batch
+
+    async def _collect(self):
+        while True:
+            await self._free.acquire()
+            try:
+                batch = await self._next_batch()
+            except BaseException:
+                self._free.release()
+                raise
+            task = asyncio.create_task(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._done)
+
+    def _done(self, task):
+        self._running.discard(task)
+        self._free.release()
+
+    async def _run(self, batch):
+        groups = {}
+        for item in batch:
+            groups.setdefault(item[0], []).append(item)
+        for key, items in groups.items():
+            items = [item for item in items if not item[2].cancelled()]
+            if not items:
+                continue
+            start_time = time.time()
+            try:
+                await self._call(key, items)
+            except Exception as e:
+                if len(items) == 1:
+                    self._fail(items, e)
+                    continue
+                # One bad input must not fail every session batched with
+                # it: retry one by one so only its own request fails.
+                logger.warning(f"[{self.name}] batch of {len(items)} failed ({e}); retrying one by one")
+                for item in items:
+                    try:
+                        await self._call(key, [item])
+                    except Exception as e:
+                        self._fail([item], e)
+            logger.debug(f"[{self.name}] batch: {len(items)}; key: {key}; "
+                         f"elapsed: {(time.time() - start_time) * 1000:.2f} milliseconds")
+
+    async def _call(self, key, items):
+        results = await asyncio.get_running_loop().run_in_executor(
+            self._executor, self.run_batch, key, [item[1] for item in items])
+        results = list(results)
+        for item, result in zip(items, results):
+            if not item[2].done():
+                item[2].set_result(result)
+        if len(results) < len(items):
+            self._fail(items[len(results):], RuntimeError(
+                f"{self.name} batch returned {len(results)} results for {len(items)} inputs"))
+
+    @staticmethod
+    def _fail(items, exc):
+        for item in items:
+            if not item[2].done():
+                item[2].set_exception(exc)
@@ -0,0 +1,61 @@
+"""Decode cost per stream per core of the WebSocket audio codecs.
+
+Encodes audio into the packets clisenvoice.py sends for each codec and
+packet length, then times `audio_codec.decode_packet` on them the way
+server_wss.py runs it (one packet at a time on a decode thread):
+
+    python bench_codec.py [--wav speech.wav] [--packet-ms 100 200 500]
+
+Reports the bitrate on the wire and how many real-time streams one
+core can decode.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from audio_codec import CODECS, decode_packet, encode_packet
+from offline import read_audio
+
+SAMPLE_RATE = 16000
+
+
+def synthetic(seconds):
+    # voiced-like harmonics with a syllable-rate envelope, plus noise
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    f0 = 140 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+    voice = sum(np.sin(k * phase) / k for k in range(1, 12))
+    envelope = np.clip(np.sin(2 * np.pi * 2.5 * t), 0, None)
+    noise = np.random.default_rng(0).normal(0, 0.01, len(t))
+    return (voice * envelope * 0.2 + noise).astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--wav", help="Audio to encode (default: 60 s of synthetic voice)")
+    parser.add_argument("--packet-ms", type=int, nargs="+", default=[100, 200, 500])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    audio = read_audio(args.wav) if args.wav else synthetic(60)
+    pcm = (np.clip(audio, -1, 1) * 32767).astype(np.int16)
+    seconds = len(pcm) / SAMPLE_RATE
+    print(f"{seconds:.1f} s of audio; pcm is {SAMPLE_RATE * 16 / 1000:.0f} kbit/s")
+    print(f"{'codec':6} {'packet':>7} {'kbit/s':>8} {'decode us/pkt':>14} {'streams/core':>13}")
+    for codec in CODECS[1:]:
+        for packet_ms in args.packet_ms:
+            n = packet_ms * SAMPLE_RATE // 1000
+            packets = [encode_packet(pcm[i:i + n], codec, SAMPLE_RATE) for i in range(0, len(pcm), n)]
+            best = float("inf")
+            for _ in range(args.repeat):
+                start = time.process_time()
+                for data in packets:
+                    decode_packet(data, codec, SAMPLE_RATE)
+                best = min(best, time.process_time() - start)
+            kbps = sum(len(p) for p in packets) * 8 / seconds / 1000
+            print(f"{codec:6} {packet_ms:>5}ms {kbps:8.1f} {best / len(packets) * 1e6:14.0f} {seconds / best:13,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Packets/sec per core of the WebSocket PCM ingest path.
+
+Replays a stream of PCM packets through three versions of the
+server_wss.py receive loop (without the model calls):
+
+    baseline  bytes concatenation + np.append of a new float32 array per packet
+    bytes     bytes carry-over, AudioRingBuffer, a new float32 array per VAD chunk
+    zerocopy  AudioRingBuffer.append_pcm + a reused float32 scratch chunk
+
+    python bench_ingest.py [--packet 1024] [--seconds 600]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from audio_buffer import AudioRingBuffer
+
+SAMPLE_RATE = 16000
+CHUNK_SIZE = int(300 * SAMPLE_RATE / 1000)
+LOOKBACK = 2 * SAMPLE_RATE
+SEGMENT = 10 * SAMPLE_RATE  # how often the baseline's segment store is reset
+
+
+def baseline(packets):
+    buffer = b""
+    audio_buffer = np.array([], dtype=np.float32)
+    audio_vad = np.array([], dtype=np.float32)
+    for data in packets:
+        buffer += data
+        if len(buffer) < 2:
+            continue
+        audio_buffer = np.append(
+            audio_buffer,
+            np.frombuffer(buffer[:len(buffer) - (len(buffer) % 2)], dtype=np.int16).astype(np.float32) / 32767.0
+        )
+        buffer = buffer[len(buffer) - (len(buffer) % 2):]
+        while len(audio_buffer) >= CHUNK_SIZE:
+            chunk = audio_buffer[:CHUNK_SIZE]
+            audio_buffer = audio_buffer[CHUNK_SIZE:]
+            audio_vad = np.append(audio_vad, chunk)
+            if len(audio_vad) >= SEGMENT:
+                audio_vad = np.array([], dtype=np.float32)
+
+
+def bytes_carry(packets):
+    audio = AudioRingBuffer()
+    vad_pos = 0
+    buffer = b""
+    for data in packets:
+        buffer += data
+        if len(buffer) < 2:
+            continue
+        audio.append(buffer[:len(buffer) - (len(buffer) % 2)])
+        buffer = buffer[len(buffer) - (len(buffer) % 2):]
+        while audio.end - vad_pos >= CHUNK_SIZE:
+            # the float32 chunk handed to VAD; its conversion is what is measured
+            audio.float32(vad_pos, vad_pos + CHUNK_SIZE)
+            vad_pos += CHUNK_SIZE
+            audio.discard_until(vad_pos - LOOKBACK)
+
+
+def zerocopy(packets):
+    audio = AudioRingBuffer()
+    vad_pos = 0
+    scratch = np.empty(CHUNK_SIZE, dtype=np.float32)
+    for data in packets:
+        audio.append_pcm(data)
+        while audio.end - vad_pos >= CHUNK_SIZE:
+            audio.float32(vad_pos, vad_pos + CHUNK_SIZE, out=scratch)
+            vad_pos += CHUNK_SIZE
+            audio.discard_until(vad_pos - LOOKBACK)
+
+
+def check(packets, rng):
+    # Both ring-buffer paths (bytes carry-over + `append`, and
+    # `append_pcm`) must store exactly the baseline's samples, for the
+    # benchmark's packets and for random sizes (0 and odd ones included)
+    # over the first 10 s.
+    pcm = b"".join(packets)
+    head = pcm[:20 * SAMPLE_RATE]
+    sizes = rng.integers(0, 2048, len(head) // 512)
+    sizes[0], sizes[1::8] = 1, 0  # an odd byte carried into empty packets
+    cuts = np.cumsum(sizes)
+    cuts = np.concatenate([[0], cuts[cuts < len(head)], [len(head)]])
+    fuzzed = [head[a:b] for a, b in zip(cuts[:-1], cuts[1:])]
+    for split, data in ((packets, pcm), (fuzzed, head)):
+        expected = np.frombuffer(data[:len(data) & ~1], dtype=np.int16)
+        carried = AudioRingBuffer()
+        buffer = b""
+        direct = AudioRingBuffer()
+        for packet in split:
+            buffer += packet
+            carried.append(buffer[:len(buffer) - (len(buffer) % 2)])
+            buffer = buffer[len(buffer) - (len(buffer) % 2):]
+            direct.append_pcm(packet)
+        assert np.array_equal(carried.view(0), expected)
+        assert np.array_equal(direct.view(0), expected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--packet", type=int, default=1024, help="Bytes per packet (clisenvoice sends 1024)")
+    parser.add_argument("--seconds", type=float, default=600, help="Seconds of audio to replay")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    pcm = rng.integers(-3000, 3000, int(args.seconds * SAMPLE_RATE), dtype=np.int16).tobytes()
+    packets = [pcm[i:i + args.packet] for i in range(0, len(pcm), args.packet)]
+    check(packets, rng)
+
+    print(f"{len(packets)} packets of {args.packet} bytes ({args.seconds:.0f} s of audio)")
+    for name, fn in (("baseline", baseline), ("bytes", bytes_carry), ("zerocopy", zerocopy)):
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.process_time()
+            fn(packets)
+            best = min(best, time.process_time() - start)
+        print(f"{name:9} {len(packets) / best:12,.0f} packets/s  "
+              f"{args.seconds / best:8,.0f}x real time per core")
+
+
+if __name__ == "__main__":
+    main()
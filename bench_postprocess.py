@@ -0,0 +1,183 @@
+"""Parity check and microbenchmark for postprocess.format_str_v3.
+
+Compares the single-pass post-processor with the original
+str.replace-based format_str_v2/v3 on a corpus of SenseVoice outputs.
+
+    python bench_postprocess.py [--number 20000]
+"""
+import argparse
+import timeit
+
+from postprocess import format_str_v3, parse_rich_text
+
+CORPUS = [
+    "<|zh|><|NEUTRAL|><|Speech|><|withitn|>你好，今天天气怎么样？",
+    "<|zh|><|HAPPY|><|Speech|><|withitn|>太好了，我们明天一起去吧。",
+    "<|en|><|NEUTRAL|><|Speech|><|withitn|>Hello, how are you doing today?",
+    "<|en|><|NEUTRAL|><|Speech|><|woitn|>the quick brown fox jumps over the lazy dog",
+    "<|ja|><|NEUTRAL|><|Speech|><|withitn|>こんにちは、元気ですか？",
+    "<|ko|><|NEUTRAL|><|Speech|><|withitn|>안녕하세요, 반갑습니다.",
+    "<|yue|><|NEUTRAL|><|Speech|><|withitn|>你食咗飯未呀？",
+    "<|nospeech|><|Event_UNK|>",
+    "<|zh|><|NEUTRAL|><|BGM|><|withitn|>",
+    "<|zh|><|SAD|><|Speech|><|withitn|>我真的很难过。",
+    "<|zh|><|ANGRY|><|Speech|><|withitn|>你怎么能这样！",
+    "<|en|><|SURPRISED|><|Speech|><|withitn|>Wow, I didn't expect that!",
+    "<|zh|><|NEUTRAL|><|Laughter|><|withitn|>哈哈哈，太搞笑了。",
+    "<|en|><|HAPPY|><|Applause|><|withitn|>Thank you all for coming.",
+    "<|zh|><|NEUTRAL|><|Cough|><|withitn|>不好意思，我感冒了。",
+    "<|zh|><|EMO_UNKNOWN|><|Speech|><|withitn|>嗯。",
+    "<|en|><|NEUTRAL|><|BGM|><|woitn|>la la la",
+    "<|zh|><|NEUTRAL|><|Speech|><|withitn|>我们用 Python 写了一个 demo。",
+    "<|zh|><|HAPPY|><|BGM|><|withitn|>欢迎收听本期节目。<|en|><|HAPPY|><|BGM|><|withitn|>Welcome to the show.",
+    "<|zh|><|NEUTRAL|><|Speech|><|withitn|>第一句。<|zh|><|NEUTRAL|><|Speech|><|withitn|>第二句。",
+    "<|en|><|NEUTRAL|><|Speech|><|withitn|>The.",
+    "<|zh|><|FEARFUL|><|Cry|><|withitn|>救命啊！",
+    "<|zh|><|DISGUSTED|><|Sneeze|><|withitn|>这是什么味道。",
+    "<|zh|><|NEUTRAL|><|Speech|><|withitn|>价格是 3.5 元，折扣 20%。",
+    "<|en|><|NEUTRAL|><|Speech|><|withitn|>Meeting at 3:30 PM on March 5th.",
+    "<|zh|><|NEUTRAL|><|Speech|><|withitn|>" + "这是一段比较长的转写结果，用来模拟持续说话的场景。" * 8,
+    "<|nospeech|><|Event_UNK|><|zh|><|NEUTRAL|><|Speech|><|withitn|>开始吧。",
+    "<|zh|><|NEUTRAL|><|Speech_Noise|><|withitn|>",
+    "<|zh|><|NEUTRAL|><|Breath|><|withitn|>呼。",
+    "<|en|><|HAPPY|><|Laughter|><|woitn|> that was great <|en|><|HAPPY|><|Laughter|><|woitn|> really ",
+]
+
+
+# The implementation replaced by postprocess.py, kept here for parity.
+emo_dict = {
+	"<|HAPPY|>": "😊",
+	"<|SAD|>": "😔",
+	"<|ANGRY|>": "😡",
+	"<|NEUTRAL|>": "",
+	"<|FEARFUL|>": "😰",
+	"<|DISGUSTED|>": "🤢",
+	"<|SURPRISED|>": "😮",
+}
+
+event_dict = {
+	"<|BGM|>": "🎼",
+	"<|Speech|>": "",
+	"<|Applause|>": "👏",
+	"<|Laughter|>": "😀",
+	"<|Cry|>": "😭",
+	"<|Sneeze|>": "🤧",
+	"<|Breath|>": "",
+	"<|Cough|>": "🤧",
+}
+
+emoji_dict = {
+	"<|nospeech|><|Event_UNK|>": "❓",
+	"<|zh|>": "",
+	"<|en|>": "",
+	"<|yue|>": "",
+	"<|ja|>": "",
+	"<|ko|>": "",
+	"<|nospeech|>": "",
+	"<|HAPPY|>": "😊",
+	"<|SAD|>": "😔",
+	"<|ANGRY|>": "😡",
+	"<|NEUTRAL|>": "",
+	"<|BGM|>": "🎼",
+	"<|Speech|>": "",
+	"<|Applause|>": "👏",
+	"<|Laughter|>": "😀",
+	"<|FEARFUL|>": "😰",
+	"<|DISGUSTED|>": "🤢",
+	"<|SURPRISED|>": "😮",
+	"<|Cry|>": "😭",
+	"<|EMO_UNKNOWN|>": "",
+	"<|Sneeze|>": "🤧",
+	"<|Breath|>": "",
+	"<|Cough|>": "😷",
+	"<|Sing|>": "",
+	"<|Speech_Noise|>": "",
+	"<|withitn|>": "",
+	"<|woitn|>": "",
+	"<|GBG|>": "",
+	"<|Event_UNK|>": "",
+}
+
+lang_dict =  {
+    "<|zh|>": "<|lang|>",
+    "<|en|>": "<|lang|>",
+    "<|yue|>": "<|lang|>",
+    "<|ja|>": "<|lang|>",
+    "<|ko|>": "<|lang|>",
+    "<|nospeech|>": "<|lang|>",
+}
+
+emo_set = {"😊", "😔", "😡", "😰", "🤢", "😮"}
+event_set = {"🎼", "👏", "😀", "😭", "🤧", "😷",}
+
+def legacy_format_str(s):
+	for sptk in emoji_dict:
+		s = s.replace(sptk, emoji_dict[sptk])
+	return s
+
+
+def legacy_format_str_v2(s):
+	sptk_dict = {}
+	for sptk in emoji_dict:
+		sptk_dict[sptk] = s.count(sptk)
+		s = s.replace(sptk, "")
+	emo = "<|NEUTRAL|>"
+	for e in emo_dict:
+		if sptk_dict[e] > sptk_dict[emo]:
+			emo = e
+	for e in event_dict:
+		if sptk_dict[e] > 0:
+			s = event_dict[e] + s
+	s = s + emo_dict[emo]
+
+	for emoji in emo_set.union(event_set):
+		s = s.replace(" " + emoji, emoji)
+		s = s.replace(emoji + " ", emoji)
+	return s.strip()
+
+def legacy_format_str_v3(s):
+	def get_emo(s):
+		return s[-1] if s[-1] in emo_set else None
+	def get_event(s):
+		return s[0] if s[0] in event_set else None
+
+	s = s.replace("<|nospeech|><|Event_UNK|>", "❓")
+	for lang in lang_dict:
+		s = s.replace(lang, "<|lang|>")
+	s_list = [legacy_format_str_v2(s_i).strip(" ") for s_i in s.split("<|lang|>")]
+	new_s = " " + s_list[0]
+	cur_ent_event = get_event(new_s)
+	for i in range(1, len(s_list)):
+		if len(s_list[i]) == 0:
+			continue
+		if get_event(s_list[i]) == cur_ent_event and get_event(s_list[i]) != None:
+			s_list[i] = s_list[i][1:]
+		#else:
+		cur_ent_event = get_event(s_list[i])
+		if get_emo(s_list[i]) != None and get_emo(s_list[i]) == get_emo(new_s):
+			new_s = new_s[:-1]
+		new_s += s_list[i].strip().lstrip()
+	new_s = new_s.replace("The.", " ")
+	return new_s.strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the rich-tag post-processors.")
+    parser.add_argument('--number', type=int, default=20000, help='Passes over the corpus per implementation.')
+    args = parser.parse_args()
+
+    mismatches = [s for s in CORPUS if legacy_format_str_v3(s) != format_str_v3(s)]
+    for s in mismatches:
+        print(f"MISMATCH {s!r}: {legacy_format_str_v3(s)!r} != {format_str_v3(s)!r}")
+    print(f"parity: {len(CORPUS) - len(mismatches)}/{len(CORPUS)} identical")
+
+    for name, fn in (("legacy format_str_v3", legacy_format_str_v3),
+                     ("format_str_v3", format_str_v3),
+                     ("parse_rich_text", parse_rich_text)):
+        elapsed = timeit.timeit(lambda: [fn(s) for s in CORPUS], number=args.number)
+        per_call = elapsed / (args.number * len(CORPUS)) * 1e6
+        print(f"{name:>22}: {per_call:8.2f} us/result")
+
+
+if __name__ == "__main__":
+    main()
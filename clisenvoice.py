@@ -1,10 +1,18 @@
 import asyncio
 import websockets
 import json
-import pyaudio
+from collections import deque
+
+import numpy as np
+
+from audio_codec import CODECS, encode_packet
+try:
+    import pyaudio
+except ImportError:  # only the microphone needs it; loadgen.py replays files
+    pyaudio = None
 
 # Audio recording settings
-FORMAT = pyaudio.paInt16
+FORMAT = pyaudio.paInt16 if pyaudio else None
 CHANNELS = 1
 RATE = 16000
 CHUNK = 512
@@ -27,16 +35,128 @@ def audio_callback(in_data, frame_count, time_info, status):
     return (None, pyaudio.paContinue)
 
 
-async def record_and_send(ws):
+class SilenceGate:
+    """Energy gate that keeps the client from streaming dead air.
+
+    A buffer is speech when its RMS exceeds `ratio` times the noise floor
+    (a slow average of the RMS of silent buffers), and at least
+    `min_rms`. Speech is sent together with the `preroll_ms` before its
+    onset and `hangover_ms` after it; the hang-over should be longer than
+    the server's max_end_silence_time so its VAD still sees the segment
+    end. Everything else is dropped and reported as `{"gap": samples}`
+    text messages, at most every `keepalive_ms` of silence and right
+    before speech resumes, so the server keeps timestamps on this
+    client's clock and the connection stays alive.
+    """
+
+    def __init__(self, rate=RATE, frame=CHUNK, min_rms=300.0, ratio=3.0, preroll_ms=300, hangover_ms=800,
+                 keepalive_ms=1000):
+        self.min_rms = min_rms
+        self.ratio = ratio
+        self.floor = min_rms / ratio
+        self.preroll = deque(maxlen=max(preroll_ms * rate // (1000 * frame), 1))
+        self.hangover = hangover_ms * rate // (1000 * frame)
+        self.keepalive = keepalive_ms * rate // 1000
+        self.left = 0       # hang-over buffers still to send
+        self.pending = 0    # samples skipped since the last gap message
+        self.total = 0
+        self.skipped = 0
+
+    def suppressed(self):
+        return self.skipped / self.total if self.total else 0.0
+
+    def process(self, data):
+        """Return the messages to send for one buffer of int16 PCM."""
+        samples = np.frombuffer(data, dtype=np.int16)
+        self.total += len(samples)
+        rms = float(np.sqrt(np.mean(np.square(samples, dtype=np.float64)))) if len(samples) else 0.0
+        if rms >= max(self.min_rms, self.floor * self.ratio):
+            self.left = self.hangover
+            out = []
+            if self.pending:
+                out.append(json.dumps({"gap": self.pending}))
+                self.pending = 0
+            out.extend(self.preroll)
+            self.preroll.clear()
+            out.append(data)
+            return out
+        self.floor += 0.05 * (rms - self.floor)
+        if self.left:
+            self.left -= 1
+            return [data]
+        if len(self.preroll) == self.preroll.maxlen:
+            dropped = len(self.preroll[0]) // 2
+            self.skipped += dropped
+            self.pending += dropped
+        self.preroll.append(data)
+        if self.pending >= self.keepalive:
+            self.pending, gap = 0, self.pending
+            return [json.dumps({"gap": gap})]
+        return []
+
+
+class PacketEncoder:
+    """Groups PCM buffers into `packet_ms` packets of `codec` (see
+    audio_codec.py); pcm buffers pass through unchanged. Text messages
+    (gap markers) flush the pending audio first to keep the order."""
+
+    def __init__(self, codec="pcm", packet_ms=200, rate=RATE):
+        self.codec = codec
+        self.packet = packet_ms * rate * 2 // 1000
+        self.rate = rate
+        self.pending = bytearray()
+        self.raw_bytes = 0
+        self.sent_bytes = 0
+
+    def process(self, message):
+        if self.codec == "pcm":
+            return [message]
+        if isinstance(message, str):
+            return self.flush() + [message]
+        self.pending += message
+        return self.flush() if len(self.pending) >= self.packet else []
+
+    def flush(self):
+        if not self.pending:
+            return []
+        data = encode_packet(np.frombuffer(self.pending, dtype=np.int16), self.codec, self.rate)
+        self.raw_bytes += len(self.pending)
+        self.sent_bytes += len(data)
+        self.pending.clear()
+        return [data]
+
+
+async def record_and_send(ws, gate=None, encoder=None):
+    encoder = encoder or PacketEncoder()
     try:
         while True:
             audio_data = await audio_queue.get()
             if ws.open:
-                await ws.send(audio_data)
+                for message in (gate.process(audio_data) if gate else (audio_data,)):
+                    for packet in encoder.process(message):
+                        await ws.send(packet)
     except asyncio.CancelledError:
         print("Audio recording stopped.")
     except Exception as e:
         print(f"Error while recording: {e}")
+    finally:
+        if gate is not None:
+            print(f"Silence gate: suppressed {gate.suppressed():.1%} of {gate.total / RATE:.1f}s of audio")
+        if encoder.raw_bytes:
+            print(f"{encoder.codec}: sent {encoder.sent_bytes / encoder.raw_bytes:.1%} of the pcm bytes")
+
+
+def build_url(lang="auto", sv=0, enc="json", host="127.0.0.1", port=8888, codec="pcm"):
+    #替换为你的启动地址，默认无证书启动ws:,有证书启动改为wss:
+    return f"ws://{host}:{port}/ws/transcribe?lang={lang}&sv={sv}&enc={enc}&codec={codec}"
+
+
+def decode_message(message):
+    """Decode one server message; `enc=msgpack` results arrive as binary frames."""
+    if isinstance(message, bytes):
+        import msgpack
+        return msgpack.unpackb(message)
+    return json.loads(message)
 
 
 async def receive_messages(ws):
@@ -44,22 +164,22 @@ async def receive_messages(ws):
         async for message in ws:
             print("Received message:", message)
             try:
-                res_json = json.loads(message)
+                res_json = decode_message(message)
                 if res_json.get("code") == 0:
+                    # json: display text in `data`; compact/msgpack: in `formatted`
+                    text = res_json.get("formatted", res_json.get("data"))
+                    print("Transcription:", text or "No speech recognized")
 
-                    print("Transcription:", res_json.get("data", "No speech recognized"))
-
-            except json.JSONDecodeError:
+            except (json.JSONDecodeError, ValueError):
                 print("Failed to parse response:", message)
     except Exception as e:
         print(f"Error while receiving: {e}")
 
 
-async def start_recording(lang="auto", sv=0):
+async def start_recording(lang="auto", sv=0, enc="json", gate=False, codec="pcm", packet_ms=200):
     global main_event_loop
     main_event_loop = asyncio.get_event_loop()  # Save the main event loop
-    #替换为你的启动地址，默认无证书启动ws:,有证书启动改为wss:
-    url = f"ws://127.0.0.1:8888/ws/transcribe?lang={lang}&sv={sv}"
+    url = build_url(lang, sv, enc, codec=codec)
     print(f"Connecting to {url}...")
 
     p = pyaudio.PyAudio()
@@ -80,7 +200,8 @@ async def start_recording(lang="auto", sv=0):
     try:
         async with websockets.connect(url) as ws:
             print("WebSocket connection established.")
-            record_task = asyncio.create_task(record_and_send(ws))
+            record_task = asyncio.create_task(record_and_send(ws, SilenceGate() if gate else None,
+                                                              PacketEncoder(codec, packet_ms)))
             receive_task = asyncio.create_task(receive_messages(ws))
 
             await asyncio.gather(record_task, receive_task)
@@ -96,6 +217,10 @@ async def start_recording(lang="auto", sv=0):
 if __name__ == "__main__":
     lang = input("Enter language code (default: auto): ") or "auto"
     sv = input("Enable speaker verification? (1 for Yes, 0 for No): ") or "0"
+    enc = input("Result encoding (json/compact/msgpack, default: json): ") or "json"
+    gate = input("Skip silence on the client? (1 for Yes, 0 for No): ") or "0"
+    codec = input(f"Audio codec ({'/'.join(CODECS)}, default: pcm): ") or "pcm"
+    packet_ms = int(input("Packet length for flac/ogg in ms (default: 200): ") or 200) if codec != "pcm" else 200
 
     # Run asyncio event loop in the main thread
-    asyncio.run(start_recording(lang=lang, sv=int(sv)))
+    asyncio.run(start_recording(lang=lang, sv=int(sv), enc=enc, gate=gate == "1", codec=codec, packet_ms=packet_ms))
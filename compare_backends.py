@@ -0,0 +1,137 @@
+"""Parity and throughput of the inference backends on this host.
+
+Every backend decodes the same WAV files: fsmn-vad streamed in
+`chunk_size_ms` chunks, then SenseVoice on the resulting segments in one
+batch per file, and optionally SV embeddings of those segments. The
+first backend is the reference for parity: character error rate of the
+recognised text and mean VAD boundary shift.
+
+    python compare_backends.py wavs/ --backends torch-cpu onnx --threads 4
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from config import Config
+from models import ModelRegistry
+from offline import list_wavs, read_audio
+from postprocess import parse_rich_text
+from speaker_index import extract_embeddings
+
+
+def edit_distance(a, b):
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+
+def stream_vad(model, audio, chunk, chunk_size_ms):
+    cache, segments, beg = {}, [], -1
+    for i in range(0, len(audio), chunk):
+        res = model.generate(input=audio[i:i + chunk], cache=cache, is_final=i + chunk >= len(audio),
+                             chunk_size=chunk_size_ms)
+        for b, e in res[0]["value"]:
+            if b > -1:
+                beg = b
+            if e > -1:
+                segments.append((beg, e))
+                beg = -1
+    return segments
+
+
+def run_backend(backend, audios, args):
+    config = Config(backend=backend, intra_op_threads=args.threads, sv_enabled=args.sv, warmup=True)
+    models = ModelRegistry(config)
+    start = time.perf_counter()
+    models.warmup()
+    load_s = time.perf_counter() - start
+    chunk = int(config.chunk_size_ms * config.sample_rate / 1000)
+    audio_s = sum(len(a) for a in audios) / config.sample_rate
+
+    vad_s = asr_s = sv_s = 0.0
+    files = []
+    for audio in audios:
+        start = time.perf_counter()
+        segments = stream_vad(models.vad, audio, chunk, config.chunk_size_ms)
+        vad_s += time.perf_counter() - start
+        clips = [audio[b * config.sample_rate // 1000:e * config.sample_rate // 1000] for b, e in segments]
+        clips = [c for c in clips if len(c)]
+        texts = []
+        if clips:
+            start = time.perf_counter()
+            res = models.asr.generate(input=clips, cache={}, language=args.lang, use_itn=True,
+                                      batch_size=len(clips), batch_size_s=config.batch_size_s)
+            asr_s += time.perf_counter() - start
+            texts = [parse_rich_text(r["text"])["text"] for r in res]
+            if args.sv:
+                start = time.perf_counter()
+                extract_embeddings(models.sv, clips)
+                sv_s += time.perf_counter() - start
+        files.append({"segments": segments, "text": "".join(texts)})
+
+    return {
+        "backend": backend,
+        "load_s": round(load_s, 2),
+        "vad_rtf": round(vad_s / audio_s, 4),
+        "asr_rtf": round(asr_s / audio_s, 4),
+        "sv_rtf": round(sv_s / audio_s, 4) if args.sv else None,
+        "total_rtf": round((vad_s + asr_s + sv_s) / audio_s, 4),
+    }, files
+
+
+def parity(files, reference):
+    errors = chars = 0
+    shifts = []
+    for f, ref in zip(files, reference):
+        errors += edit_distance(f["text"], ref["text"])
+        chars += len(ref["text"])
+        if len(f["segments"]) == len(ref["segments"]):
+            shifts += [abs(a - b) for s, r in zip(f["segments"], ref["segments"]) for a, b in zip(s, r)]
+    return {
+        "cer": round(errors / chars, 4) if chars else 0.0,
+        "vad_shift_ms": round(float(np.mean(shifts)), 1) if shifts else None,
+        "vad_segment_count_match": sum(len(f["segments"]) == len(r["segments"]) for f, r in zip(files, reference)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare inference backends on a set of WAV files.")
+    parser.add_argument("path", help="WAV file or directory of WAV files")
+    parser.add_argument("--backends", nargs="+", default=["torch-cuda", "torch-cpu", "onnx"],
+                        help="Backends to run; the first is the parity reference")
+    parser.add_argument("--threads", type=int, default=0, help="intra_op_threads for every backend")
+    parser.add_argument("--lang", default="auto")
+    parser.add_argument("--sv", action="store_true", help="Also time SV embeddings")
+    parser.add_argument("--report", help="Write the results as JSON here")
+    args = parser.parse_args()
+
+    audios = [read_audio(f) for f in list_wavs(args.path)]
+    results, reference = [], None
+    for backend in args.backends:
+        try:
+            result, files = run_backend(backend, audios, args)
+        except Exception as e:
+            print(f"{backend}: unavailable ({type(e).__name__}: {e})")
+            continue
+        if reference is None:
+            reference = files
+        result.update(parity(files, reference))
+        results.append(result)
+
+    print(f"{'backend':12} {'load s':>8} {'vad rtf':>9} {'asr rtf':>9} {'total rtf':>10} {'cer':>7} {'vad shift':>10}")
+    for r in results:
+        print(f"{r['backend']:12} {r['load_s']:>8} {r['vad_rtf']:>9} {r['asr_rtf']:>9} {r['total_rtf']:>10} "
+              f"{r['cer']:>7} {str(r['vad_shift_ms']):>10}")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
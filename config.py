@@ -0,0 +1,62 @@
+from typing import Literal
+
+from pydantic_settings import BaseSettings
+from pydantic import Field
+
+
+class Config(BaseSettings):
+    sv_thr: float = Field(0.3, description="Speaker verification threshold")
+    chunk_size_ms: int = Field(300, description="Chunk size in milliseconds")
+    sample_rate: int = Field(16000, description="Sample rate in Hz")
+    bit_depth: int = Field(16, description="Bit depth")
+    channels: int = Field(1, description="Number of audio channels")
+    avg_logprob_thr: float = Field(-0.25, description="average logprob threshold")
+    vad_lookback_ms: int = Field(2000, description="Audio kept behind the VAD cursor while no speech is open, in milliseconds")
+    batch_size_s: int = Field(60, description="Max seconds of audio per ASR/SV batch")
+    batch_max_wait_ms: int = Field(10, description="How long a batch waits for segments from other sessions, in milliseconds")
+    vad_workers: int = Field(1, description="Threads running VAD inference; more than 1 only on the onnx backend, see ModelRegistry.workers")
+    sv_workers: int = Field(1, description="Threads running speaker embedding batches; always 1, SV runs on torch (see ModelRegistry.workers)")
+    asr_workers: int = Field(1, description="Threads running ASR batches; more than 1 only on the onnx backend, see ModelRegistry.workers")
+    decode_workers: int = Field(2, description="Threads decoding compressed (flac/ogg) WebSocket audio")
+
+    backend: Literal["torch-cuda", "torch-cpu", "onnx"] = Field("torch-cuda", description="Inference backend, see backends.py")
+    device: str = Field("cuda:0", description="Device the torch-cuda backend runs on")
+    quantize: bool = Field(True, description="int8 weights on the torch-cpu (dynamic quantization) and onnx (quantized export) backends")
+    intra_op_threads: int = Field(0, description="Intra-op threads of the torch / ONNX Runtime backends; 0 for the library default")
+    inter_op_threads: int = Field(0, description="Torch inter-op threads; 0 for the library default")
+    onnx_vad_model: str = Field("iic/speech_fsmn_vad_zh-cn-16k-common-pytorch", description="fsmn-vad model exported for the onnx backend")
+    onnx_batch_size: int = Field(8, description="Max segments per ONNX Runtime SenseVoice call")
+    asr_model: str = Field("iic/SenseVoiceSmall", description="ASR model id")
+    asr_model_revision: str = Field("master", description="ASR model revision")
+    asr_remote_code: str = Field("./model.py", description="SenseVoice model code loaded with trust_remote_code")
+    vad_model: str = Field("fsmn-vad", description="VAD model id")
+    vad_model_revision: str = Field("v2.0.4", description="VAD model revision")
+    max_end_silence_time: int = Field(500, description="Trailing silence that ends a VAD segment, in milliseconds")
+    sv_model: str = Field("iic/speech_eres2net_large_sv_zh-cn_3dspeaker_16k", description="Speaker verification model id")
+    sv_model_revision: str = Field("v1.0.0", description="Speaker verification model revision")
+    max_segment_s: float = Field(20.0, description="Open segments are cut once they reach this many seconds")
+    min_segment_ms: int = Field(0, description="Segments shorter than this are not decoded, in milliseconds")
+    cut_search_s: float = Field(2.0, description="How far before max_segment_s to look for the quietest cut point, in seconds")
+    partial_interval_ms: int = Field(1000, description="New audio between two interim results of an open segment, in milliseconds")
+    partial_window_s: float = Field(8.0, description="Max seconds of audio re-decoded for one interim result")
+    partial_budget: float = Field(0.25, description="Max share of a segment's wall time a session may spend on interim decodes")
+    max_sessions: int = Field(64, description="Max concurrent WebSocket sessions; 0 for no limit")
+    max_session_pending_s: float = Field(10.0, description="A session is closed once this many seconds of its audio wait for VAD; 0 for no limit")
+    shed_sv_backlog_s: float = Field(30.0, description="Skip speaker verification while this many seconds of audio are queued for ASR; 0 to never skip")
+    shed_partials_backlog_s: float = Field(60.0, description="Drop interim results while this many seconds of audio are queued for ASR; 0 to never drop")
+    saturated_backlog_s: float = Field(120.0, description="Refuse new sessions and uploads while this many seconds of audio are queued for ASR; 0 to never refuse")
+    retry_after_s: int = Field(5, description="Retry-after hint sent with refused sessions and uploads, in seconds")
+    sv_min_audio_s: float = Field(1.0, description="Speech needed before the first speaker verification of a segment, in seconds")
+    sv_interval_s: float = Field(1.0, description="New speech between two speaker verification attempts, in seconds")
+    sv_max_attempts: int = Field(3, description="Max speaker verification attempts per segment")
+    sv_window_s: float = Field(3.0, description="Speaker verification embeds only this many most recent seconds; 0 for the whole segment")
+    sv_sticky_thr: float = Field(0.8, description="Similarity to the previous segment's speaker embedding above which that speaker is kept without re-verification")
+    diarization: bool = Field(False, description="Label segments no enrolled speaker claims as session-local spk-1, spk-2, ... by default")
+    diarization_thr: float = Field(0.6, description="Similarity to a speaker cluster needed to join it")
+    diarization_max_speakers: int = Field(16, description="Max speaker clusters per session")
+    admin_enabled: bool = Field(False, description="Serve /admin/traces and /admin/profile and honour ?trace=1 on sessions")
+    trace_max_events: int = Field(100000, description="Max spans recorded per traced session")
+    trace_keep: int = Field(32, description="Traces of finished sessions kept for /admin/traces")
+    profile_max_s: float = Field(60.0, description="Longest capture /admin/profile runs, in seconds")
+    sv_enabled: bool = Field(True, description="Load the speaker verification stage")
+    warmup: bool = Field(True, description="Run a synthetic inference through every enabled stage at startup")
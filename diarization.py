@@ -0,0 +1,46 @@
+import numpy as np
+
+
+class OnlineDiarizer:
+    """Session-local speaker clusters for segments no enrolled speaker claims.
+
+    Each finalized segment contributes one (L2-normalized) embedding.
+    It joins the cluster whose centroid is most similar if the cosine
+    score reaches `threshold`, and that centroid moves to the running
+    mean of its members; otherwise it starts a new cluster, labelled
+    `spk-1`, `spk-2`, ... in order of appearance. Once `max_speakers`
+    clusters exist, new embeddings join the closest one. Centroids live
+    in one preallocated matrix, so an assignment is a single mat-vec.
+    """
+
+    def __init__(self, threshold=0.6, max_speakers=16, prefix="spk-"):
+        self.threshold = threshold
+        self.max_speakers = max_speakers
+        self.prefix = prefix
+        self.count = 0
+        self._sums = None       # per-cluster sum of member embeddings
+        self._centroids = None  # normalized `_sums`, i.e. the direction of the mean
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.diarization_thr, config.diarization_max_speakers)
+
+    def assign(self, emb):
+        """Return the cluster label for `emb` and update that cluster."""
+        emb = np.asarray(emb, dtype=np.float32).ravel()
+        if self._sums is None:
+            self._sums = np.zeros((self.max_speakers, len(emb)), dtype=np.float32)
+            self._centroids = np.zeros_like(self._sums)
+        i = -1
+        if self.count:
+            scores = self._centroids[:self.count] @ emb
+            i = int(np.argmax(scores))
+            if scores[i] < self.threshold and self.count < self.max_speakers:
+                i = -1
+        if i < 0:
+            i = self.count
+            self.count += 1
+        self._sums[i] += emb
+        norm = np.linalg.norm(self._sums[i])
+        self._centroids[i] = self._sums[i] / norm if norm else self._sums[i]
+        return f"{self.prefix}{i + 1}"
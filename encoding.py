@@ -0,0 +1,84 @@
+import json
+from json.encoder import encode_basestring
+
+from postprocess import format_str_v3, parse_rich_text
+
+ENCODINGS = ("json", "compact", "msgpack")
+
+# "compact" messages are filled into fixed templates; only the string
+# fields go through the (C) JSON string escaper.
+_COMPACT_RESULT = ('{"code":%d,"text":%s,"formatted":%s,"lang":%s,"emotion":%s,'
+                   '"events":[%s],"speaker":%s,"start":%d,"end":%d}')
+_COMPACT_EVENT = '{"code":2,"info":%s,"speaker":%s}'
+
+
+def _str(s):
+    return "null" if s is None else encode_basestring(s)
+
+
+class ResultEncoder:
+    """Serializes the messages of one session in the negotiated encoding.
+
+    "json" is the original protocol: a TranscriptionResponse whose `info`
+    holds the raw result as a JSON string. "compact" (JSON text) and
+    "msgpack" (binary) send one flat object per message with the parsed
+    fields instead, so a client decodes each message once:
+
+        code 0 (final) / 1 (partial): text, formatted, lang, emotion,
+            events, speaker, start, end (ms since stream start)
+        code 2 (speech/speaker detected): info, speaker
+
+    Every method returns str (a text frame) or bytes (a binary frame).
+    """
+
+    def __init__(self, enc="json"):
+        if enc not in ENCODINGS:
+            raise ValueError(f"unknown encoding: {enc}")
+        self.enc = enc
+        if enc == "msgpack":
+            import msgpack
+
+            self._packer = msgpack.Packer(use_bin_type=True)
+            # reused for every message of the session
+            self._result = dict.fromkeys(("code", "text", "formatted", "lang", "emotion",
+                                          "events", "speaker", "start", "end"))
+            self._event = {"code": 2, "info": None, "speaker": None}
+
+    @property
+    def media_type(self):
+        return "application/x-msgpack" if self.enc == "msgpack" else "application/x-ndjson"
+
+    def result(self, code, result, speaker, start, end):
+        """A final (code 0) or partial (code 1) result for [start, end) ms."""
+        if self.enc == "json":
+            info = dict(result, speaker=speaker, start=start, end=end)
+            return self._legacy(code, json.dumps(info, ensure_ascii=False), format_str_v3(result["text"]))
+        parsed = parse_rich_text(result["text"])
+        if self.enc == "compact":
+            return _COMPACT_RESULT % (
+                code, encode_basestring(parsed["text"]), encode_basestring(parsed["formatted"]),
+                _str(parsed["lang"]), encode_basestring(parsed["emotion"]),
+                ",".join(map(encode_basestring, parsed["events"])), _str(speaker), start, end,
+            )
+        msg = self._result
+        msg["code"] = code
+        msg.update(parsed)
+        msg["speaker"] = speaker
+        msg["start"] = start
+        msg["end"] = end
+        return self._packer.pack(msg)
+
+    def event(self, info, speaker):
+        """A code 2 speech/speaker detection message."""
+        if self.enc == "json":
+            return self._legacy(2, info, speaker)
+        if self.enc == "compact":
+            return _COMPACT_EVENT % (encode_basestring(info), _str(speaker))
+        self._event["info"] = info
+        self._event["speaker"] = speaker
+        return self._packer.pack(self._event)
+
+    @staticmethod
+    def _legacy(code, info, data):
+        # same bytes as send_json(TranscriptionResponse(...).model_dump())
+        return json.dumps({"code": code, "info": info, "data": data}, ensure_ascii=False, separators=(",", ":"))
@@ -0,0 +1,267 @@
+"""Replay WAV files over concurrent /ws/transcribe connections.
+
+Every connection streams the files back to back (each followed by
+`--gap-s` of silence so VAD closes the last segment) at `--speed` times
+real time, using the same URL and message decoding as clisenvoice.py.
+Latency is measured from the moment the audio at a final result's `end`
+was sent to the moment that result arrived. Server RTF is read from the
+/metrics delta over the run; every worker process keeps its own
+counters and a scrape reaches whichever one accepts it, so the server
+must run a single worker (`--workers 1`) for those numbers to mean
+anything.
+
+    python loadgen.py wavs/ -c 8 --speed 1 --report run.json
+    python loadgen.py wavs/ -c 8 --spawn --baseline base.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from bisect import bisect_left
+
+import numpy as np
+import websockets
+
+from clisenvoice import CHUNK, RATE, build_url, decode_message
+from offline import list_wavs, read_audio
+
+
+def load_pcm(path):
+    audio = read_audio(path, target_rate=RATE)
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+
+
+def final_end(message):
+    """`end` (ms since stream start) of a code 0 message in any encoding."""
+    if "end" in message:
+        return message["end"]
+    return json.loads(message["info"]).get("end")
+
+
+def scrape(host, port):
+    """Return {sample name: value} from /metrics, or {} if unreachable."""
+    try:
+        with urllib.request.urlopen(f"http://{host}:{port}/metrics", timeout=5) as r:
+            text = r.read().decode()
+    except OSError:
+        return {}
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, _, value = line.rpartition(" ")
+            samples[name] = float(value)
+    return samples
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []
+        self.finals = 0
+        self.audio_s = 0.0
+        self.dropped = 0
+        self.errors = []
+        self.last_at = None  # last audio sent or final received
+
+
+async def connection(index, clips, args, stats):
+    url = build_url(args.lang, 0, args.enc, args.host, args.port)
+    gap = b"\0\0" * int(args.gap_s * RATE)
+    step = CHUNK * 2
+    sent_ms, sent_at = [], []
+
+    async def sender(ws):
+        pos = 0  # bytes sent on this connection
+        start = time.perf_counter()
+        for _ in range(args.loops):
+            for i in range(len(clips)):
+                pcm = clips[(index + i) % len(clips)]
+                stats.audio_s += len(pcm) / 2 / RATE
+                pcm += gap
+                for off in range(0, len(pcm), step):
+                    await ws.send(pcm[off:off + step])
+                    pos += len(pcm[off:off + step])
+                    sent_ms.append(pos * 1000 // (2 * RATE))
+                    sent_at.append(time.perf_counter())
+                    if args.speed > 0:
+                        delay = start + pos / (2 * RATE * args.speed) - time.perf_counter()
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+                    else:
+                        await asyncio.sleep(0)
+        stats.last_at = max(stats.last_at or 0.0, time.perf_counter())
+
+    async def receiver(ws, sending):
+        while True:
+            try:
+                # once everything is sent, stop after `idle_s` without results
+                raw = await asyncio.wait_for(ws.recv(), args.idle_s)
+            except asyncio.TimeoutError:
+                if sending.done():
+                    return
+                continue
+            now = time.perf_counter()
+            message = decode_message(raw)
+            if message.get("code") != 0:
+                continue
+            stats.finals += 1
+            stats.last_at = max(stats.last_at or 0.0, now)
+            end = final_end(message)
+            i = bisect_left(sent_ms, end) if end is not None else len(sent_ms)
+            if i < len(sent_at):
+                stats.latencies.append(now - sent_at[i])
+
+    sending = receiving = None
+    try:
+        async with websockets.connect(url, max_size=None) as ws:
+            sending = asyncio.ensure_future(sender(ws))
+            receiving = asyncio.ensure_future(receiver(ws, sending))
+            done, _ = await asyncio.wait({sending, receiving}, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+            await receiving
+    except Exception as e:
+        stats.dropped += 1
+        stats.errors.append(f"connection {index}: {type(e).__name__}: {e}")
+    finally:
+        for task in (sending, receiving):
+            if task is not None:
+                task.cancel()
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    ms = np.asarray(values) * 1000
+    return {
+        "mean": round(float(ms.mean()), 2),
+        **{f"p{p}": round(float(np.percentile(ms, p)), 2) for p in (50, 90, 95, 99)},
+        "max": round(float(ms.max()), 2),
+    }
+
+
+def delta(after, before, name):
+    return after.get(name, 0.0) - before.get(name, 0.0)
+
+
+async def run(args, clips):
+    stats = Stats()
+    before = scrape(args.host, args.port)
+    start = time.perf_counter()
+    await asyncio.gather(*(connection(i, clips, args, stats) for i in range(args.connections)))
+    # the trailing `idle_s` wait is not part of the run
+    wall_s = (stats.last_at or time.perf_counter()) - start
+    after = scrape(args.host, args.port)
+
+    segments = delta(after, before, "sensevoice_segment_rtf_count")
+    return {
+        "config": {
+            "connections": args.connections, "speed": args.speed, "loops": args.loops,
+            "files": len(clips), "enc": args.enc, "lang": args.lang,
+        },
+        "wall_s": round(wall_s, 3),
+        "audio_s": round(stats.audio_s, 3),
+        "throughput_x": round(stats.audio_s / wall_s, 3) if wall_s else 0.0,
+        "finals": stats.finals,
+        "finals_per_s": round(stats.finals / wall_s, 3) if wall_s else 0.0,
+        "dropped": stats.dropped,
+        "errors": stats.errors,
+        "latency_ms": percentiles(stats.latencies),
+        "server": {
+            "segments": int(segments),
+            "rtf_mean": round(delta(after, before, "sensevoice_segment_rtf_sum") / segments, 4) if segments else None,
+        } if after else None,
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Print report vs baseline; return the list of regressions."""
+    rows = [
+        ("latency p50 ms", report["latency_ms"].get("p50"), baseline["latency_ms"].get("p50"), 1),
+        ("latency p95 ms", report["latency_ms"].get("p95"), baseline["latency_ms"].get("p95"), 1),
+        ("latency p99 ms", report["latency_ms"].get("p99"), baseline["latency_ms"].get("p99"), 1),
+        ("throughput x", report["throughput_x"], baseline["throughput_x"], -1),
+        ("server rtf", (report["server"] or {}).get("rtf_mean"), (baseline["server"] or {}).get("rtf_mean"), 1),
+    ]
+    regressions = []
+    for name, new, old, worse in rows:
+        if new is None or old is None:
+            print(f"{name:16} {'n/a':>10}")
+            continue
+        change = (new - old) / old if old else 0.0
+        flag = ""
+        if change * worse > tolerance:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:16} {old:>10} -> {new:<10} {change:+.1%}{flag}")
+    if report["dropped"] > baseline["dropped"]:
+        print(f"dropped          {baseline['dropped']:>10} -> {report['dropped']}  REGRESSION")
+        regressions.append("dropped")
+    return regressions
+
+
+def spawn_server(args):
+    here = os.path.dirname(os.path.abspath(__file__))
+    cmd = [sys.executable, os.path.join(here, "server_wss.py"), "--port", str(args.port)]
+    proc = subprocess.Popen(cmd, cwd=here)
+    deadline = time.monotonic() + args.ready_timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"server_wss.py exited with {proc.returncode}")
+        try:
+            with urllib.request.urlopen(f"http://{args.host}:{args.port}/readyz", timeout=2):
+                return proc
+        except OSError:
+            time.sleep(1)
+    proc.terminate()
+    raise SystemExit("server_wss.py did not become ready in time")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent WebSocket load generator for server_wss.py.")
+    parser.add_argument("path", help="WAV file or directory of WAV files to replay")
+    parser.add_argument("-c", "--connections", type=int, default=4, help="Concurrent connections")
+    parser.add_argument("--speed", type=float, default=1.0, help="Pacing as a multiple of real time; 0 sends as fast as possible")
+    parser.add_argument("--loops", type=int, default=1, help="Times every connection replays the file list")
+    parser.add_argument("--lang", default="auto")
+    parser.add_argument("--enc", default="compact", choices=["json", "compact", "msgpack"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8888)
+    parser.add_argument("--gap-s", type=float, default=1.0, help="Silence sent after every file")
+    parser.add_argument("--idle-s", type=float, default=5.0, help="Wait for results this long after the last audio")
+    parser.add_argument("--report", default="loadgen_report.json", help="Where to write the JSON report")
+    parser.add_argument("--baseline", help="Earlier report to compare against; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Relative change counted as a regression")
+    parser.add_argument("--spawn", action="store_true", help="Start a single-worker server_wss.py on --port and wait for /readyz")
+    parser.add_argument("--ready-timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    files = list_wavs(args.path)
+    if not files:
+        raise SystemExit(f"no .wav files in {args.path}")
+    clips = [load_pcm(f) for f in files]
+
+    server = spawn_server(args) if args.spawn else None
+    try:
+        report = asyncio.run(run(args, clips))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
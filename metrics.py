@@ -0,0 +1,105 @@
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+def _value(v):
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Counter:
+    """A running total, or one read from `fn` at scrape time."""
+
+    kind = "counter"
+
+    def __init__(self, labels=None, fn=None):
+        self.labels = _labels(labels)
+        self.value = 0
+        self.fn = fn
+
+    def inc(self, n=1):
+        self.value += n
+
+    def samples(self, name):
+        yield f"{name}{self.labels} {_value(self.fn() if self.fn else self.value)}"
+
+
+class Gauge(Counter):
+    """A value that goes up and down, or is read from `fn` at scrape time."""
+
+    kind = "gauge"
+
+    def dec(self, n=1):
+        self.value -= n
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    """Fixed-bucket histogram; counts are per bucket and only made
+    cumulative when rendered."""
+
+    kind = "histogram"
+
+    def __init__(self, buckets=LATENCY_BUCKETS, labels=None):
+        self.buckets = tuple(buckets)
+        self.labels = labels or {}
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self, name):
+        prefix = "".join(f'{k}="{v}",' for k, v in self.labels.items())
+        total = 0
+        for le, n in zip(self.buckets + ("+Inf",), self.counts):
+            total += n
+            yield f'{name}_bucket{{{prefix}le="{le}"}} {total}'
+        yield f"{name}_sum{_labels(self.labels)} {self.sum!r}"
+        yield f"{name}_count{_labels(self.labels)} {total}"
+
+
+class MetricsRegistry:
+    """Prometheus text-format metrics for one process.
+
+    Metrics are plain attributes bumped without locks: they are only
+    updated from the event loop thread, so an update is a couple of
+    integer/float operations on preallocated slots. Each forked worker
+    has its own registry.
+    """
+
+    def __init__(self, prefix=""):
+        self.prefix = prefix
+        self._families = {}
+
+    def _add(self, name, help, metric):
+        family = self._families.setdefault(self.prefix + name, (metric.kind, help, []))
+        family[2].append(metric)
+        return metric
+
+    def counter(self, name, help, labels=None, fn=None):
+        return self._add(name, help, Counter(labels, fn))
+
+    def gauge(self, name, help, labels=None, fn=None):
+        return self._add(name, help, Gauge(labels, fn))
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS, labels=None):
+        return self._add(name, help, Histogram(buckets, labels))
+
+    def render(self):
+        lines = []
+        for name, (kind, help, metrics) in self._families.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for metric in metrics:
+                lines.extend(metric.samples(name))
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,146 @@
+import threading
+import time
+
+import numpy as np
+from loguru import logger
+
+import backends
+
+
+class ModelRegistry:
+    """Builds each model the first time it is used.
+
+    `asr`, `vad` and `sv` load on first access (thread-safe, once), so
+    importing a front end costs nothing and stages that are never used
+    are never loaded. `warmup` loads the enabled stages and pushes one
+    synthetic input through each so the first real request does not pay
+    for lazy initialisation; `ready` is set once it has finished.
+    `Config.backend` picks how each stage runs (see backends.py).
+    """
+
+    STAGES = ("vad", "asr", "sv")
+
+    def __init__(self, config):
+        self.config = config
+        self.ready = False
+        self._models = {}
+        self._lock = threading.Lock()
+        self._threads_set = False
+
+    def enabled(self, name):
+        return name != "sv" or self.config.sv_enabled
+
+    def on_torch(self, name):
+        return self.config.backend != "onnx" or name == "sv"
+
+    def fork_safe(self, name):
+        # ONNX Runtime thread pools do not survive fork()
+        return self.on_torch(name)
+
+    def workers(self, name):
+        """Threads that may run stage `name` at once (`Config.<name>_workers`).
+
+        funasr's AutoModel merges each call's kwargs, the stream's VAD
+        `cache` and the ASR batch options included, into one dict shared
+        by the instance, and the modelscope SV pipeline keeps per-call
+        parameters on the instance the same way; so two concurrent calls
+        can run with each other's state. Only onnx stages, which keep no
+        per-call state on the model, get more than one thread.
+        """
+        workers = max(getattr(self.config, f"{name}_workers"), 1)
+        if workers > 1 and self.on_torch(name):
+            logger.warning(f"[models] {name}_workers={workers} needs the onnx backend; using 1 {name} thread")
+            return 1
+        return workers
+
+    def get(self, name):
+        model = self._models.get(name)
+        if model is None:
+            with self._lock:
+                model = self._models.get(name)
+                if model is None:
+                    if not self.enabled(name):
+                        raise RuntimeError(f"model stage `{name}` is disabled")
+                    if self.on_torch(name) and not self._threads_set:
+                        backends.set_torch_threads(self.config.intra_op_threads, self.config.inter_op_threads)
+                        self._threads_set = True
+                    start_time = time.time()
+                    model = getattr(self, f"_build_{name}")()
+                    self._models[name] = model
+                    logger.info(f"[models] loaded {name} ({self.config.backend}) in {time.time() - start_time:.2f} seconds")
+        return model
+
+    @property
+    def asr(self):
+        return self.get("asr")
+
+    @property
+    def vad(self):
+        return self.get("vad")
+
+    @property
+    def sv(self):
+        return self.get("sv")
+
+    def _build_asr(self):
+        if self.config.backend == "onnx":
+            return backends.OnnxSenseVoice(self.config)
+        from funasr import AutoModel
+
+        model = AutoModel(
+            model=self.config.asr_model,
+            model_revision=self.config.asr_model_revision,
+            trust_remote_code=True,
+            remote_code=self.config.asr_remote_code,
+            disable_update=True,
+            device=backends.torch_device(self.config),
+        )
+        if self.config.backend == "torch-cpu" and self.config.quantize:
+            model.model = backends.quantize_dynamic(model.model)
+        return model
+
+    def _build_vad(self):
+        if self.config.backend == "onnx":
+            return backends.OnnxStreamingVad(self.config)
+        from funasr import AutoModel
+
+        return AutoModel(
+            model=self.config.vad_model,
+            model_revision=self.config.vad_model_revision,
+            disable_pbar=True,
+            max_end_silence_time=self.config.max_end_silence_time,
+            # speech_noise_thres=0.6,
+            disable_update=True,
+            device=backends.torch_device(self.config),
+        )
+
+    def _build_sv(self):
+        from modelscope.pipelines import pipeline
+
+        return pipeline(
+            task='speaker-verification',
+            model=self.config.sv_model,
+            model_revision=self.config.sv_model_revision,
+            device="gpu" if self.config.backend == "torch-cuda" else "cpu",
+        )
+
+    def load(self, stages=None):
+        """Build `stages` (default: every enabled stage) without running them."""
+        for name in stages or [s for s in self.STAGES if self.enabled(s)]:
+            self.get(name)
+
+    def warmup(self, stages=None):
+        stages = stages or [s for s in self.STAGES if self.enabled(s)]
+        self.load(stages)
+        if self.config.warmup:
+            # low-level noise rather than zeros, so every code path runs
+            audio = np.random.default_rng(0).normal(0, 0.01, self.config.sample_rate).astype(np.float32)
+            start_time = time.time()
+            if "vad" in stages:
+                self.vad.generate(input=audio, cache={}, is_final=True, chunk_size=self.config.chunk_size_ms)
+            if "asr" in stages:
+                self.asr.generate(input=audio, cache={}, language="auto", use_itn=True)
+            if "sv" in stages:
+                self.sv([audio], output_emb=True)
+            logger.info(f"[models] warmup of {stages} took {time.time() - start_time:.2f} seconds")
+        self.ready = True
@@ -0,0 +1,82 @@
+import os
+
+import numpy as np
+import soundfile as sf
+
+from audio_codec import AudioDecodeError
+from backends import merge_segments
+
+# container signatures soundfile can decode; anything else is raw PCM
+_HEADERS = (b"RIFF", b"fLaC", b"OggS", b"FORM")
+
+
+def list_wavs(path):
+    """`path` itself if it is a file, else the .wav files in it."""
+    if os.path.isfile(path):
+        return [path]
+    return sorted(os.path.join(path, f) for f in os.listdir(path) if f.lower().endswith(".wav"))
+
+
+def read_audio(f, fmt=None, sample_rate=16000, target_rate=16000):
+    """Decode a whole file into mono float32 at `target_rate`.
+
+    `f` is a path or a binary file object. `fmt` is "wav", "flac", "ogg"
+    or "pcm" (raw little-endian int16 at `sample_rate`); when omitted it
+    is sniffed from the file header. Undecodable input raises
+    `AudioDecodeError`; resampling needs scipy.
+    """
+    if isinstance(f, str):
+        with open(f, "rb") as fp:
+            return read_audio(fp, fmt, sample_rate, target_rate)
+    if fmt is None:
+        head = f.read(4)
+        f.seek(0)
+        fmt = "pcm" if head not in _HEADERS else None
+    if fmt == "pcm":
+        data = f.read()
+        audio = np.frombuffer(data[:len(data) - len(data) % 2], dtype=np.int16).astype(np.float32) / 32767.0
+        sr = sample_rate
+    else:
+        try:
+            audio, sr = sf.read(f, dtype="float32", always_2d=True)
+        except (sf.LibsndfileError, RuntimeError, TypeError, ValueError) as e:
+            raise AudioDecodeError(getattr(e, "error_string", str(e))) from None
+        audio = audio.mean(axis=1) if audio.shape[1] > 1 else audio[:, 0]
+    if sr != target_rate:
+        from math import gcd
+        from scipy.signal import resample_poly
+
+        g = gcd(sr, target_rate)
+        audio = resample_poly(audio, target_rate // g, sr // g)
+    return np.ascontiguousarray(audio, dtype=np.float32)
+
+
+def vad_segments(vad_model, audio, sample_rate=16000):
+    """Run fsmn-vad over the whole of `audio` in one non-streaming pass.
+
+    Returns [(beg_ms, end_ms), ...].
+    """
+    # The model is shared with the streaming sessions, and some funasr
+    # versions keep the kwargs of earlier calls; so the call is made one
+    # final chunk of the whole audio with a fresh cache, and any
+    # [beg, -1] ... [-1, end] fragments are joined.
+    res = vad_model.generate(input=audio, cache={}, is_final=True,
+                             chunk_size=len(audio) * 1000 // sample_rate + 1)
+    return [(int(beg), int(end)) for beg, end in merge_segments(res[0]["value"])]
+
+
+def plan_batches(segments, batch_size_s):
+    """Group consecutive segments into batches of at most `batch_size_s`
+    seconds of audio; a longer segment gets a batch of its own."""
+    batches, batch, total = [], [], 0
+    budget = batch_size_s * 1000
+    for seg in segments:
+        dur = seg[1] - seg[0]
+        if batch and total + dur > budget:
+            batches.append(batch)
+            batch, total = [], 0
+        batch.append(seg)
+        total += dur
+    if batch:
+        batches.append(batch)
+    return batches
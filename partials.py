@@ -0,0 +1,70 @@
+import asyncio
+import time
+
+
+class PartialTranscriber:
+    """Interim results for the speech segment that is still open.
+
+    Every `interval_ms` of new audio, `poll` starts one background decode
+    of at most `window_s` seconds. Audio older than the window is
+    committed once as a stable prefix, so the cost of a partial does not
+    grow with the utterance. Partials are skipped while one is still in
+    flight, while `busy()` reports queued final decodes, or once this
+    session has spent more than `budget` of the segment's wall time on
+    them, so they never delay a final result.
+    """
+
+    def __init__(self, decode, emit, sample_rate=16000, interval_ms=1000, window_s=8.0, budget=0.25, busy=None):
+        self.decode = decode                # async (float32 audio) -> raw text
+        self.emit = emit                    # async (segment, text, end) -> None
+        self.interval = int(interval_ms * sample_rate / 1000)
+        self.window = int(window_s * sample_rate)
+        self.budget = budget
+        self.busy = busy or (lambda: False)
+        self.segment = 0
+        self.beg = None
+        self.task = None
+
+    def close(self):
+        """The open segment was finalised; drop anything still pending."""
+        self.segment += 1
+        self.beg = None
+
+    def poll(self, audio, beg, pos):
+        """Schedule a partial for segment [beg, pos) of `audio` if one is due."""
+        if beg != self.beg:
+            self.segment += 1
+            self.beg = beg
+            self.stable_pos = beg
+            self.stable_text = ""
+            self.next_pos = beg + self.interval
+            self.started = time.monotonic()
+            self.spent = 0.0
+        if pos < self.next_pos or (self.task is not None and not self.task.done()):
+            return
+        if self.spent > self.budget * (time.monotonic() - self.started) or self.busy():
+            return
+        self.next_pos = pos + self.interval
+        if pos - self.stable_pos > self.window:
+            # commit everything but the last half window as stable text
+            cut = pos - self.window // 2
+            self.task = asyncio.create_task(self._run(self.segment, audio.float32(self.stable_pos, cut), cut, cut))
+        else:
+            self.task = asyncio.create_task(self._run(self.segment, audio.float32(self.stable_pos, pos), None, pos))
+
+    async def _run(self, segment, samples, cut, end):
+        start_time = time.monotonic()
+        text = await self.decode(samples)
+        if segment != self.segment:
+            return
+        self.spent += time.monotonic() - start_time
+        if cut is not None:
+            # nothing new to show until the tail is decoded on the next tick
+            self.stable_text += text
+            self.stable_pos = cut
+            self.next_pos = 0
+            return
+        # `emit` must drop the message if `segment` is no longer current
+        # by the time it gets to send it. `end` is the position the text
+        # covers, not where the stream is by now.
+        await self.emit(segment, self.stable_text + text, end)
@@ -0,0 +1,139 @@
+import re
+
+# SenseVoice emits `<|...|>` tags for language, emotion, audio events and
+# ITN mode in front of each language span. Tags not listed here are kept
+# as literal text.
+LANGS = {"zh", "en", "yue", "ja", "ko", "nospeech"}
+
+EMOTIONS = {
+    "HAPPY": "😊",
+    "SAD": "😔",
+    "ANGRY": "😡",
+    "NEUTRAL": "",
+    "FEARFUL": "😰",
+    "DISGUSTED": "🤢",
+    "SURPRISED": "😮",
+}
+
+EVENTS = {
+    "BGM": "🎼",
+    "Speech": "",
+    "Applause": "👏",
+    "Laughter": "😀",
+    "Cry": "😭",
+    "Sneeze": "🤧",
+    "Breath": "",
+    "Cough": "🤧",
+}
+
+OTHER_TAGS = {"EMO_UNKNOWN", "Sing", "Speech_Noise", "withitn", "woitn", "GBG", "Event_UNK"}
+
+EMO_SET = {"😊", "😔", "😡", "😰", "🤢", "😮"}
+EVENT_SET = {"🎼", "👏", "😀", "😭", "🤧", "😷"}
+
+_TAG = re.compile(r"<\|([^|]*)\|>")
+# one space on either side of an emoji is dropped
+_EMOJI_SPACE = re.compile(" ?([" + "".join(sorted(EMO_SET | EVENT_SET)) + "]) ?")
+
+
+_KNOWN = set(EMOTIONS) | set(EVENTS) | OTHER_TAGS
+_EMO_RANK = {e: i for i, e in enumerate(EMOTIONS)}
+_EVENT_EMOJIS = tuple((e, emoji) for e, emoji in EVENTS.items() if emoji)
+
+
+def _split(s):
+    """Tokenize `s` in one pass into language spans.
+
+    Returns a list of (lang, tag counts, text) with every known tag
+    removed from the text.
+    """
+    # [text, tag, text, tag, ..., text]
+    parts = _TAG.split(s)
+    n = len(parts)
+    spans = []
+    lang, counts, text = None, {}, [parts[0]]
+    i = 1
+    while i < n:
+        tag = parts[i]
+        if tag == "nospeech" and i + 2 < n and parts[i + 2] == "Event_UNK" and not parts[i + 1]:
+            text.append("❓")
+            i += 2
+        elif tag in LANGS:
+            spans.append((lang, counts, "".join(text)))
+            lang, counts, text = tag, {}, []
+        elif tag in _KNOWN:
+            counts[tag] = counts.get(tag, 0) + 1
+        else:
+            text.append("<|" + tag + "|>")
+        text.append(parts[i + 1])
+        i += 2
+    spans.append((lang, counts, "".join(text)))
+    return spans
+
+
+def _emotion(counts):
+    # the first emotion (in EMOTIONS order) with the highest count, if
+    # that count beats NEUTRAL's
+    emo = "NEUTRAL"
+    best = counts.get(emo, 0)
+    for e, n in counts.items():
+        if e in _EMO_RANK and (n > best or (n == best and emo != "NEUTRAL" and _EMO_RANK[e] < _EMO_RANK[emo])):
+            emo, best = e, n
+    return emo
+
+
+def _format_span(counts, text):
+    s = text
+    if counts:
+        # each event found is prepended, so the last one ends up first
+        for e, emoji in _EVENT_EMOJIS:
+            if e in counts:
+                s = emoji + s
+        s += EMOTIONS[_emotion(counts)]
+    return _EMOJI_SPACE.sub(r"\1", s).strip()
+
+
+def _format(spans):
+    parts = [_format_span(counts, text).strip(" ") for _, counts, text in spans]
+    new_s = " " + parts[0]
+    cur_event = None
+    for part in parts[1:]:
+        if not part:
+            continue
+        # an event repeated at the start of consecutive spans is shown once
+        if part[0] in EVENT_SET and part[0] == cur_event:
+            part = part[1:]
+        cur_event = part[0] if part and part[0] in EVENT_SET else None
+        # so is an emotion repeated at their end
+        if part and part[-1] in EMO_SET and part[-1] == new_s[-1]:
+            new_s = new_s[:-1]
+        new_s += part.strip()
+    return new_s.replace("The.", " ").strip()
+
+
+def parse_rich_text(s):
+    """Parse a raw SenseVoice result in a single pass.
+
+    Returns a dict with `lang` (first language tag), `emotion` and
+    `events` (tag names), `text` (without tags) and `formatted`, the
+    display string with emotion/event emojis that `format_str_v3` returns.
+    """
+    spans = _split(s)
+    total = {}
+    events = []
+    for _, counts, _ in spans:
+        for tag, n in counts.items():
+            total[tag] = total.get(tag, 0) + n
+            if tag in EVENTS and tag not in events:
+                events.append(tag)
+    return {
+        "lang": next((lang for lang, _, _ in spans if lang is not None), None),
+        "emotion": _emotion(total),
+        "events": events,
+        "text": "".join(text.strip() for _, _, text in spans),
+        "formatted": _format(spans),
+    }
+
+
+def format_str_v3(s):
+    return _format(_split(s))
@@ -0,0 +1,47 @@
+import numpy as np
+
+
+class SegmentationPolicy:
+    """Limits on the length of the segments handed to ASR.
+
+    VAD alone only ends a segment on silence, so continuous speech or
+    music would grow one segment without bound. Once an open segment
+    reaches `max_segment_s`, `forced_cut` picks the quietest `frame_ms`
+    frame within the last `cut_search_s` before the limit, and the
+    segment is decoded up to there while speech continues after it.
+    Segments shorter than `min_segment_ms` are not decoded at all.
+    All positions are absolute sample indices.
+    """
+
+    def __init__(self, max_segment_s=20.0, min_segment_ms=0, cut_search_s=2.0, frame_ms=20, sample_rate=16000):
+        self.max_len = int(max_segment_s * sample_rate)
+        self.min_len = int(min_segment_ms * sample_rate / 1000)
+        self.search = int(cut_search_s * sample_rate)
+        self.frame = max(int(frame_ms * sample_rate / 1000), 1)
+
+    @classmethod
+    def from_config(cls, config, sample_rate=None):
+        return cls(config.max_segment_s, config.min_segment_ms, config.cut_search_s,
+                   sample_rate=sample_rate or config.sample_rate)
+
+    def too_short(self, beg, end):
+        return end - beg < max(self.min_len, 1)
+
+    def forced_cut(self, audio, beg, pos):
+        """Return where to cut the segment open since `beg`, or None.
+
+        `audio` is the session's `AudioRingBuffer` and `pos` the end of
+        the audio VAD has seen so far.
+        """
+        if self.max_len <= 0 or pos - beg < self.max_len:
+            return None
+        limit = beg + self.max_len
+        lo = max(limit - self.search, beg + max(self.min_len, self.frame), audio.start)
+        samples = audio.view(lo, limit)
+        n = len(samples) // self.frame
+        if n == 0:
+            return limit
+        frames = samples[:n * self.frame].reshape(n, self.frame).astype(np.float32)
+        energy = np.einsum("ij,ij->i", frames, frames)
+        # cut in the middle of the quietest frame
+        return lo + int(np.argmin(energy)) * self.frame + self.frame // 2
@@ -1,25 +1,36 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, HTTPException
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.status import HTTP_422_UNPROCESSABLE_ENTITY
-from pydantic_settings import BaseSettings
-from pydantic import BaseModel, Field
-from funasr import AutoModel
-import numpy as np
-import soundfile as sf
+from pydantic import BaseModel
 import argparse
 import uvicorn
 from urllib.parse import parse_qs
-import os
 import re
-from modelscope.pipelines import pipeline
-from modelscope.utils.constant import Tasks
 from loguru import logger
 import sys
 import json
 import traceback
 import time
+import tempfile
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from audio_codec import CODECS, AudioDecodeError, decode_packet
+from speaker_index import SpeakerIndex, extract_embeddings
+from batching import MicroBatcher
+from workers import serve_workers
+from config import Config
+from models import ModelRegistry
+from partials import PartialTranscriber
+from encoding import ResultEncoder
+from metrics import MetricsRegistry
+from admission import AdmissionController, SessionOverloaded
+from streaming import StreamingRecognizer, StreamEvent
+from diarization import OnlineDiarizer
+from segmentation import SegmentationPolicy
+from offline import read_audio, vad_segments, plan_batches
+from tracing import NULL_TRACE, SessionTrace, TraceStore, Profiler
 
 logger.remove()
 log_format = "{time:YYYY-MM-DD HH:mm:ss} [{level}] {file}:{line} - {message}"
@@ -27,214 +38,167 @@ logger.add(sys.stdout, format=log_format, level="DEBUG", filter=lambda record: r
 logger.add(sys.stderr, format=log_format, level="ERROR", filter=lambda record: record["level"].no >= 40)
 
 
-class Config(BaseSettings):
-    sv_thr: float = Field(0.3, description="Speaker verification threshold")
-    chunk_size_ms: int = Field(300, description="Chunk size in milliseconds")
-    sample_rate: int = Field(16000, description="Sample rate in Hz")
-    bit_depth: int = Field(16, description="Bit depth")
-    channels: int = Field(1, description="Number of audio channels")
-    avg_logprob_thr: float = Field(-0.25, description="average logprob threshold")
-
 config = Config()
 
-emo_dict = {
-	"<|HAPPY|>": "😊",
-	"<|SAD|>": "😔",
-	"<|ANGRY|>": "😡",
-	"<|NEUTRAL|>": "",
-	"<|FEARFUL|>": "😰",
-	"<|DISGUSTED|>": "🤢",
-	"<|SURPRISED|>": "😮",
-}
-
-event_dict = {
-	"<|BGM|>": "🎼",
-	"<|Speech|>": "",
-	"<|Applause|>": "👏",
-	"<|Laughter|>": "😀",
-	"<|Cry|>": "😭",
-	"<|Sneeze|>": "🤧",
-	"<|Breath|>": "",
-	"<|Cough|>": "🤧",
-}
-
-emoji_dict = {
-	"<|nospeech|><|Event_UNK|>": "❓",
-	"<|zh|>": "",
-	"<|en|>": "",
-	"<|yue|>": "",
-	"<|ja|>": "",
-	"<|ko|>": "",
-	"<|nospeech|>": "",
-	"<|HAPPY|>": "😊",
-	"<|SAD|>": "😔",
-	"<|ANGRY|>": "😡",
-	"<|NEUTRAL|>": "",
-	"<|BGM|>": "🎼",
-	"<|Speech|>": "",
-	"<|Applause|>": "👏",
-	"<|Laughter|>": "😀",
-	"<|FEARFUL|>": "😰",
-	"<|DISGUSTED|>": "🤢",
-	"<|SURPRISED|>": "😮",
-	"<|Cry|>": "😭",
-	"<|EMO_UNKNOWN|>": "",
-	"<|Sneeze|>": "🤧",
-	"<|Breath|>": "",
-	"<|Cough|>": "😷",
-	"<|Sing|>": "",
-	"<|Speech_Noise|>": "",
-	"<|withitn|>": "",
-	"<|woitn|>": "",
-	"<|GBG|>": "",
-	"<|Event_UNK|>": "",
-}
-
-lang_dict =  {
-    "<|zh|>": "<|lang|>",
-    "<|en|>": "<|lang|>",
-    "<|yue|>": "<|lang|>",
-    "<|ja|>": "<|lang|>",
-    "<|ko|>": "<|lang|>",
-    "<|nospeech|>": "<|lang|>",
-}
-
-emo_set = {"😊", "😔", "😡", "😰", "🤢", "😮"}
-event_set = {"🎼", "👏", "😀", "😭", "🤧", "😷",}
-
-def format_str(s):
-	for sptk in emoji_dict:
-		s = s.replace(sptk, emoji_dict[sptk])
-	return s
-
-
-def format_str_v2(s):
-	sptk_dict = {}
-	for sptk in emoji_dict:
-		sptk_dict[sptk] = s.count(sptk)
-		s = s.replace(sptk, "")
-	emo = "<|NEUTRAL|>"
-	for e in emo_dict:
-		if sptk_dict[e] > sptk_dict[emo]:
-			emo = e
-	for e in event_dict:
-		if sptk_dict[e] > 0:
-			s = event_dict[e] + s
-	s = s + emo_dict[emo]
-
-	for emoji in emo_set.union(event_set):
-		s = s.replace(" " + emoji, emoji)
-		s = s.replace(emoji + " ", emoji)
-	return s.strip()
-
-def format_str_v3(s):
-	def get_emo(s):
-		return s[-1] if s[-1] in emo_set else None
-	def get_event(s):
-		return s[0] if s[0] in event_set else None
-
-	s = s.replace("<|nospeech|><|Event_UNK|>", "❓")
-	for lang in lang_dict:
-		s = s.replace(lang, "<|lang|>")
-	s_list = [format_str_v2(s_i).strip(" ") for s_i in s.split("<|lang|>")]
-	new_s = " " + s_list[0]
-	cur_ent_event = get_event(new_s)
-	for i in range(1, len(s_list)):
-		if len(s_list[i]) == 0:
-			continue
-		if get_event(s_list[i]) == cur_ent_event and get_event(s_list[i]) != None:
-			s_list[i] = s_list[i][1:]
-		#else:
-		cur_ent_event = get_event(s_list[i])
-		if get_emo(s_list[i]) != None and get_emo(s_list[i]) == get_emo(new_s):
-			new_s = new_s[:-1]
-		new_s += s_list[i].strip().lstrip()
-	new_s = new_s.replace("The.", " ")
-	return new_s.strip()
 
 def contains_chinese_english_number(s: str) -> bool:
     # Check if the string contains any Chinese character, English letter, or Arabic number
     return bool(re.search(r'[\u4e00-\u9fffA-Za-z0-9]', s))
 
 
-sv_pipeline = pipeline(
-    task='speaker-verification',
-    model='iic/speech_eres2net_large_sv_zh-cn_3dspeaker_16k',
-    model_revision='v1.0.0',
-)
-
-
-asr_pipeline = pipeline(
-    task=Tasks.auto_speech_recognition,
-    model='iic/SenseVoiceSmall',
-    model_revision="master",
-    disable_update=True
-)
-
-model_asr = AutoModel(
-    model="iic/SenseVoiceSmall",
-    trust_remote_code=True,
-    remote_code="./model.py",    
-
-    disable_update=True,
-    #device="cpu"
-    device="cuda:0"
-)
-
-model_vad = AutoModel(
-    model="fsmn-vad",
-    model_revision="v2.0.4",
-    disable_pbar = True,
-    max_end_silence_time=500,
-    # speech_noise_thres=0.6,
-    disable_update=True,
-    device="cuda:0",
-    # device="cpu"
-)
+# Models are built on first use (or by `load_models` at startup), so only
+# the stages enabled in `Config` are ever loaded.
+models = ModelRegistry(config)
 
 reg_spks_files = [
     "speaker/久倾standard.wav"
 ]
 
 def reg_spk_init(files):
-    reg_spk = {}
-    for f in files:
-        data, sr = sf.read(f, dtype="float32")
-        k, _ = os.path.splitext(os.path.basename(f))
-        reg_spk[k] = {
-            "data": data,
-            "sr":   sr,
-        }
-    return reg_spk
-
-reg_spks = reg_spk_init(reg_spks_files)
-
-def speaker_verify(audio, sv_thr):
-    hit = False
-    for k, v in reg_spks.items():
-        res_sv = sv_pipeline([audio, v["data"]], sv_thr)
-        if res_sv["score"] >= sv_thr:
-           hit = True
-        logger.info(f"[speaker_verify] audio_len: {len(audio)}; sv_thr: {sv_thr}; hit: {hit}; {k}: {res_sv}")
+    # Enrollment embeddings are extracted once and persisted next to the
+    # WAVs; later runs only embed new or re-recorded files.
+    return SpeakerIndex.load_or_build(files, lambda audios: extract_embeddings(models.sv, audios))
+
+reg_spks = SpeakerIndex([], [])
+warmup_error = None   # set if warmup failed; /readyz then reports "failed"
+enroll_error = None   # set if enrollment failed; SV runs with nobody enrolled
+
+def load_models():
+    global reg_spks, enroll_error
+    models.warmup()
+    if config.sv_enabled:
+        # Enrollment must not hold back readiness: without it every
+        # speaker is just "unknown".
+        try:
+            reg_spks = reg_spk_init(reg_spks_files)
+        except Exception as e:
+            enroll_error = str(e)
+            logger.error(f"Speaker enrollment failed, continuing without enrolled speakers: {e}")
+
+def sv_batch(key, audios):
+    return extract_embeddings(models.sv, audios)
+
+
+def asr_batch(key, audios):
+    lang, use_itn = key
+    return models.asr.generate(
+        input           = audios,
+        cache           = {},
+        language        = lang,
+        use_itn         = use_itn,
+        batch_size      = len(audios),
+        batch_size_s    = config.batch_size_s,
+    )
+
+segmentation = SegmentationPolicy.from_config(config)
+
+# Finished segments from all sessions are queued here and decoded in
+# batches instead of one model call per segment.
+# Every stage runs on its own bounded thread pool so inference never
+# blocks the event loop that serves all connections.
+sv_batcher = MicroBatcher(sv_batch, config.batch_max_wait_ms, config.batch_size_s, config.sample_rate,
+                          name="sv", workers=models.workers("sv"))
+asr_batcher = MicroBatcher(asr_batch, config.batch_max_wait_ms, config.batch_size_s, config.sample_rate,
+                           name="asr", workers=models.workers("asr"))
+vad_executor = ThreadPoolExecutor(max_workers=models.workers("vad"), thread_name_prefix="vad")
+decode_executor = ThreadPoolExecutor(max_workers=config.decode_workers, thread_name_prefix="decode")
+
+# Session limits and load shedding, driven by the ASR backlog.
+admission = AdmissionController.from_config(config, asr_batcher.backlog_s)
+
+# Exported on /metrics. Stage times are measured around the awaits on the
+# event loop, so they include time spent queued for a batch or a thread.
+metrics = MetricsRegistry("sensevoice_")
+stage_seconds = {
+    stage: metrics.histogram("stage_seconds", "Wall time per decoded packet, VAD chunk, SV check or ASR segment",
+                             labels={"stage": stage})
+    for stage in ("decode", "vad", "sv", "asr", "asr_partial")
+}
+segment_seconds = metrics.histogram("segment_seconds", "Duration of the audio segments decoded",
+                                    buckets=(0.5, 1, 2, 5, 10, 20, 30, 60))
+segment_rtf = metrics.histogram("segment_rtf", "ASR real-time factor (decode time / audio duration) per segment",
+                                buckets=(0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2))
+active_sessions = metrics.gauge("active_sessions", "Open WebSocket sessions")
+ingested_bytes = metrics.counter("ingested_bytes_total", "Audio bytes received")
+skipped_seconds = metrics.counter("client_skipped_seconds_total", "Silence clients reported as skipped instead of sending")
+for batcher in (sv_batcher, asr_batcher):
+    metrics.gauge("queue_depth", "Segments waiting for a batch", labels={"stage": batcher.name}, fn=batcher.qsize)
+for work in admission.shed:
+    metrics.counter("shed_total", "Optional work skipped under load", labels={"work": work},
+                    fn=lambda work=work: admission.shed[work])
+for reason in admission.rejected:
+    metrics.counter("rejected_total", "Sessions and uploads refused", labels={"reason": reason},
+                    fn=lambda reason=reason: admission.rejected[reason])
+metrics.gauge("load_level", "0 normal, 1 shedding SV, 2 also shedding partials, 3 refusing new work",
+              fn=admission.level)
+metrics.gauge("asr_backlog_seconds", "Seconds of audio queued for ASR", fn=asr_batcher.backlog_s)
+overloaded_sessions = metrics.counter("overloaded_sessions_total",
+                                      "Sessions closed for exceeding max_session_pending_s")
+sv_embeddings = metrics.counter("sv_embeddings_total", "Speaker embeddings computed; those not followed by a check kept the previous speaker")
+sv_checks = metrics.counter("sv_checks_total", "Speaker verification checks against a non-empty index")
+sv_hits = metrics.counter("sv_hits_total", "Speaker verification checks above sv_thr")
+
+# Per-session traces (?trace=1) and on-demand profiles, both only when
+# `admin_enabled`; untraced sessions record into NULL_TRACE, a no-op.
+traces = TraceStore(config.trace_keep)
+profiler = Profiler()
+
+def vad_chunk(chunk, cache):
+    return models.vad.generate(input=chunk, cache=cache, is_final=False, chunk_size=config.chunk_size_ms)
+
+async def vad(chunk, cache):
+    # `cache` is the session's streaming VAD state. A session awaits its
+    # chunks one at a time, so the state is never used concurrently.
+    start_time = time.perf_counter()
+    res = await asyncio.get_running_loop().run_in_executor(vad_executor, vad_chunk, chunk, cache)
+    stage_seconds["vad"].observe(time.perf_counter() - start_time)
+    return res
+
+async def decode_audio(data, codec):
+    start_time = time.perf_counter()
+    samples = await asyncio.get_running_loop().run_in_executor(decode_executor, decode_packet, data, codec,
+                                                               config.sample_rate)
+    stage_seconds["decode"].observe(time.perf_counter() - start_time)
+    return samples
+
+async def embed_speaker(audio):
+    start_time = time.perf_counter()
+    emb = await sv_batcher.submit(audio)
+    stage_seconds["sv"].observe(time.perf_counter() - start_time)
+    sv_embeddings.inc()
+    return emb
+
+def match_speaker(emb, sv_thr):
+    k, score = reg_spks.match(emb)
+    hit = score >= sv_thr
+    sv_checks.inc()
+    if hit:
+        sv_hits.inc()
+    logger.info(f"[speaker_verify] sv_thr: {sv_thr}; hit: {hit}; {k}: {score:.5f}")
     return hit, k
 
+async def speaker_verify(audio, sv_thr):
+    if not len(reg_spks):  # not loaded yet or nobody enrolled
+        return False, None
+    return match_speaker(await embed_speaker(audio), sv_thr)
 
-def asr(audio, lang, cache, use_itn=False):
+
+async def asr(audio, lang, use_itn=False, partial=False):
     # with open('test.pcm', 'ab') as f:
     #     logger.debug(f'write {f.write(audio)} bytes to `test.pcm`')
-    # result = asr_pipeline(audio, lang)
-    start_time = time.time()
-    result = model_asr.generate(
-        input           = audio,
-        cache           = cache,
-        language        = lang.strip(),
-        use_itn         = use_itn,
-        batch_size_s    = 60,
-    )
-    end_time = time.time()
-    elapsed_time = end_time - start_time
+    start_time = time.perf_counter()
+    result = await asr_batcher.submit(audio, (lang.strip(), use_itn))
+    elapsed_time = time.perf_counter() - start_time
     logger.debug(f"asr elapsed: {elapsed_time * 1000:.2f} milliseconds")
-    return result
+    if partial:
+        stage_seconds["asr_partial"].observe(elapsed_time)
+    else:
+        duration = len(audio) / config.sample_rate
+        stage_seconds["asr"].observe(elapsed_time)
+        segment_seconds.observe(duration)
+        if duration > 0:
+            segment_rtf.observe(elapsed_time / duration)
+    return [result]
 
 app = FastAPI()
 
@@ -266,7 +230,7 @@ async def custom_exception_handler(request: Request, exc: Exception):
         status_code=status_code,
         content=TranscriptionResponse(
             code=status_code,
-            msg=message,
+            info=message,
             data=data
         ).model_dump()
     )
@@ -277,161 +241,350 @@ class TranscriptionResponse(BaseModel):
     info: str
     data: str
 
+@app.on_event("startup")
+async def startup():
+    # Warm up in the background: /healthz answers right away and /readyz
+    # turns 200 once every enabled stage has run once.
+    def done(fut):
+        global warmup_error
+        if fut.exception() is not None:
+            warmup_error = str(fut.exception())
+            logger.error(f"Model warmup failed: {fut.exception()}")
+    asyncio.get_running_loop().run_in_executor(None, load_models).add_done_callback(done)
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    if warmup_error is not None:
+        return JSONResponse(status_code=503, content={"status": "failed", "error": warmup_error})
+    if not models.ready:
+        return JSONResponse(status_code=503, content={"status": "warming up"})
+    if enroll_error is not None:
+        return {"status": "ready", "speakers": f"unavailable: {enroll_error}"}
+    return {"status": "ready"}
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def require_admin():
+    if not config.admin_enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+@app.get("/admin/traces")
+async def list_traces():
+    require_admin()
+    return {"traces": traces.ids()}
+
+@app.get("/admin/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    """A session's spans as Chrome trace-event JSON (chrome://tracing, Perfetto)."""
+    require_admin()
+    trace = traces.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"unknown trace: {trace_id}")
+    return JSONResponse(trace.export())
+
+@app.post("/admin/profile")
+async def profile(mode: str = "cpu", seconds: float = 10.0, top: int = 50):
+    """Profile the live process for `seconds` and return the report as text.
+
+    mode=cpu runs cProfile on the event loop thread (sorted by cumulative
+    time); mode=memory diffs two tracemalloc snapshots. One at a time.
+    """
+    require_admin()
+    if mode not in ("cpu", "memory"):
+        raise HTTPException(status_code=400, detail=f"unsupported mode: {mode}")
+    if not 0 < seconds <= config.profile_max_s:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {config.profile_max_s}]")
+    if profiler.busy():
+        raise HTTPException(status_code=409, detail="a profile is already running")
+    logger.info(f"[profile] {mode} for {seconds}s")
+    report = await (profiler.cpu(seconds, top) if mode == "cpu" else profiler.memory(seconds, top))
+    return PlainTextResponse(report)
+
+@app.post("/v1/transcribe")
+async def transcribe_file(request: Request):
+    """Transcribe an uploaded WAV/FLAC/PCM file, streaming NDJSON results.
+
+    The whole file goes through fsmn-vad in one offline pass and the
+    segments are decoded in `batch_size_s` batches through the same ASR
+    (and SV) batchers as the WebSocket sessions. Each line is a
+    TranscriptionResponse like the WebSocket's final results.
+    Query: lang, format (wav|flac|ogg|pcm, sniffed if omitted),
+    sample_rate (for pcm), enc (json|compact|msgpack, see `ResultEncoder`),
+    diarize (label unknown speakers spk-1, spk-2, ...).
+    """
+    lang = request.query_params.get('lang', 'auto').lower()
+    diarizer = None
+    if config.sv_enabled and request.query_params.get('diarize', str(config.diarization)).lower() in ['true', '1', 't', 'y', 'yes']:
+        diarizer = OnlineDiarizer.from_config(config)
+    fmt = request.query_params.get('format')
+    try:
+        encoder = ResultEncoder(request.query_params.get('enc', 'json'))
+    except (ValueError, ImportError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        sample_rate = int(request.query_params.get('sample_rate', config.sample_rate))
+    except ValueError:
+        sample_rate = 0
+    if sample_rate <= 0:
+        raise HTTPException(status_code=400, detail="sample_rate must be a positive integer")
+    if admission.saturated():
+        raise HTTPException(status_code=503, detail="server busy",
+                            headers={"Retry-After": str(admission.retry_after_s)})
+    if fmt is not None and fmt not in ('wav', 'flac', 'ogg', 'pcm'):
+        raise HTTPException(status_code=400, detail=f"unsupported format: {fmt}")
+    loop = asyncio.get_running_loop()
+
+    # Spool the upload as it arrives instead of buffering the body in memory.
+    upload = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+    async for data in request.stream():
+        ingested_bytes.inc(len(data))
+        upload.write(data)
+    upload.seek(0)
+    try:
+        audio = await loop.run_in_executor(None, read_audio, upload, fmt, sample_rate, config.sample_rate)
+    except AudioDecodeError as e:
+        # anything else (e.g. scipy missing for resampling) is a server error
+        raise HTTPException(status_code=400, detail=f"cannot decode audio: {e}")
+    finally:
+        upload.close()
+    segments = await loop.run_in_executor(vad_executor, lambda: vad_segments(models.vad, audio, config.sample_rate))
+    logger.info(f"[transcribe] audio_len: {len(audio)}; segments: {len(segments)}")
+
+    async def decode(beg_ms, end_ms):
+        seg = audio[int(beg_ms * config.sample_rate / 1000):int(end_ms * config.sample_rate / 1000)]
+        spk = 'unknown'
+        emb = None
+        if config.sv_enabled and not admission.shed_sv():
+            if diarizer is not None:
+                emb = await embed_speaker(seg)
+                hit, speaker = match_speaker(emb, config.sv_thr) if len(reg_spks) else (False, None)
+            else:
+                hit, speaker = await speaker_verify(seg, config.sv_thr)
+            if hit:
+                spk = speaker
+                emb = None
+        result = (await asr(seg, lang, True))[0]
+        return result, spk, emb
+
+    async def results():
+        # One batch in flight at a time so a long file does not crowd
+        # live sessions out of the shared batchers.
+        for batch in plan_batches(segments, config.batch_size_s):
+            tasks = [asyncio.ensure_future(decode(beg, end)) for beg, end in batch]
+            try:
+                for (beg, end), task in zip(batch, tasks):
+                    result, spk, emb = await task
+                    if emb is not None:
+                        # clusters are assigned in file order
+                        spk = diarizer.assign(emb)
+                    message = encoder.result(0, result, spk, beg, end)
+                    yield message if isinstance(message, bytes) else message + "\n"
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+    return StreamingResponse(results(), media_type=encoder.media_type)
+
 @app.websocket("/ws/transcribe")
 async def websocket_endpoint(websocket: WebSocket):
+    query_params = parse_qs(websocket.scope['query_string'].decode())
+    # Result encoding (json|compact|msgpack); json is the original protocol.
+    # Audio codec (pcm|flac|ogg, see audio_codec.py); pcm is the original one.
+    codec = query_params.get('codec', ['pcm'])[0].lower()
     try:
-        query_params = parse_qs(websocket.scope['query_string'].decode())
-        sv = True
+        encoder = ResultEncoder(query_params.get('enc', ['json'])[0].lower())
+        if codec not in CODECS:
+            raise ValueError(f"unsupported codec: {codec}")
+    except (ValueError, ImportError) as e:
+        logger.warning(f"Rejecting WebSocket: {e}")
+        await websocket.close(code=1008)
+        return
+    refused = admission.admit()
+    if refused is not None:
+        logger.warning(f"Rejecting WebSocket: {refused}")
+        # 1013 "try again later"; accepted first so the client sees the code
+        await websocket.accept()
+        await websocket.close(code=1013, reason=f"server busy ({refused}); retry-after={admission.retry_after_s}")
+        return
+    active_sessions.inc()
+    reader = engine = None
+    try:
+        sv = config.sv_enabled
         #sv = query_params.get('sv', ['false'])[0].lower() in ['true', '1', 't', 'y', 'yes']
         lang = query_params.get('lang', ['auto'])[0].lower()
-        
-        await websocket.accept()
-        chunk_size = int(config.chunk_size_ms * config.sample_rate / 1000)
-        audio_buffer = np.array([], dtype=np.float32)
-        audio_vad = np.array([], dtype=np.float32)
-
-        cache = {}
-        cache_asr = {}
-        last_vad_beg = last_vad_end = -1
-        offset = 0
-        hit = False
-        
-        buffer = b""
-        while True:
-            data = await websocket.receive_bytes()
-            # logger.info(f"received {len(data)} bytes")
-
-            
-            buffer += data
-            if len(buffer) < 2:
-                continue
-                
-            audio_buffer = np.append(
-                audio_buffer, 
-                np.frombuffer(buffer[:len(buffer) - (len(buffer) % 2)], dtype=np.int16).astype(np.float32) / 32767.0
+        partial = query_params.get('partial', ['false'])[0].lower() in ['true', '1', 't', 'y', 'yes']
+        diarize = query_params.get('diarize', [str(config.diarization)])[0].lower() in ['true', '1', 't', 'y', 'yes']
+        trace = NULL_TRACE
+        headers = None
+        if config.admin_enabled and query_params.get('trace', ['false'])[0].lower() in ['true', '1', 't', 'y', 'yes']:
+            # tid 0 is the session loop, 1 the interim decodes, 2 the reader
+            trace = SessionTrace("ws", config.trace_max_events, {0: "session", 1: "partials", 2: "receive"})
+            traces.add(trace)
+            headers = [(b"x-trace-id", trace.id.encode())]
+            logger.info(f"[trace] session {trace.id}")
+
+        await websocket.accept(headers=headers)
+        # Final results, speaker events and partials are sent from
+        # different tasks; the lock keeps a partial from overtaking the
+        # final result of its segment.
+        send_lock = asyncio.Lock()
+
+        async def send(message):
+            async with send_lock:
+                with trace.span("send"):
+                    await send_message(message)
+
+        async def send_message(message):
+            if isinstance(message, bytes):
+                await websocket.send_bytes(message)
+            else:
+                await websocket.send_text(message)
+
+        partials = None
+        if partial:
+            async def decode_partial(samples):
+                with trace.span("asr_partial", 1):
+                    return (await asr(samples, lang.strip(), True, partial=True))[0]['text']
+
+            async def send_partial(segment, text, end):
+                async with send_lock:
+                    if segment == partials.segment:
+                        with trace.span("format", 1):
+                            message = encoder.result(1, {"text": text}, engine.speaker, engine.ms(partials.beg),
+                                                     engine.ms(end))
+                        with trace.span("send", 1):
+                            await send_message(message)
+
+            partials = PartialTranscriber(
+                decode_partial, send_partial, config.sample_rate,
+                config.partial_interval_ms, config.partial_window_s, config.partial_budget,
+                busy=lambda: asr_batcher.qsize() > 0 or admission.shed_partials(),
             )
-            
-            # with open('buffer.pcm', 'ab') as f:
-            #     logger.debug(f'write {f.write(buffer[:len(buffer) - (len(buffer) % 2)])} bytes to `buffer.pcm`')
-                
-            buffer = buffer[len(buffer) - (len(buffer) % 2):]
-   
-            while len(audio_buffer) >= chunk_size:
-                chunk = audio_buffer[:chunk_size]
-                audio_buffer = audio_buffer[chunk_size:]
-                audio_vad = np.append(audio_vad, chunk)
-                
-                # with open('chunk.pcm', 'ab') as f:
-                #     logger.debug(f'write {f.write(chunk)} bytes to `chunk.pcm`')
-                    
-                if last_vad_beg > 1:
-                    # if sv:
-                    #     # speaker verify
-                    #     # If no hit is detected, continue accumulating audio data and check again until a hit is detected
-                    #     # `hit` will reset after `asr`.
-                    #     if not hit:
-                    #         hit, speaker = speaker_verify(audio_vad[int((last_vad_beg - offset) * config.sample_rate / 1000):], config.sv_thr)
-                    #         if hit:
-                    #             response = TranscriptionResponse(
-                    #                 code=2,
-                    #                 info="detect speaker",
-                    #                 data=speaker
-                    #             )
-                    #             await websocket.send_json(response.model_dump())
-                    # else:
-                    #     response = TranscriptionResponse(
-                    #         code=2,
-                    #         info="detect speech",
-                    #         data='unknown'
-                    #     )
 
+        async def decode_final(samples):
+            return (await asr(samples, lang.strip(), True))[0]
+
+        # The chunk -> VAD -> SV -> ASR loop is shared with the GUIs; the
+        # hooks add this server's batching, metrics and load shedding.
+        engine = StreamingRecognizer.from_config(
+            config, vad, decode_final,
+            embed=embed_speaker if sv else None,
+            match=lambda emb: match_speaker(emb, config.sv_thr),
+            has_speakers=lambda: len(reg_spks) > 0,  # not loaded yet or nobody enrolled
+            segmentation=segmentation,
+            # Segments no enrolled speaker claims get a session-local label.
+            diarizer=OnlineDiarizer.from_config(config) if sv and diarize else None,
+            partials=partials,
+            shed_sv=admission.shed_sv,
+            trace=trace,
+        )
+
+        # Frames are read as they arrive, independently of inference, so a
+        # session that falls behind shows up as audio pending for VAD.
+        max_pending = int(config.max_session_pending_s * config.sample_rate)
+        received = asyncio.Event()
+
+        async def receive_audio():
+            try:
+                while True:
+                    message = await websocket.receive()
+                    if message["type"] == "websocket.disconnect":
+                        raise WebSocketDisconnect(message.get("code", 1000))
+                    data = message.get("bytes")
+                    if data is None:
+                        # control message: the client skipped `gap` samples
+                        # of silence at this point of the stream, see GapMap
+                        try:
+                            skipped = int(json.loads(message["text"])["gap"])
+                        except (ValueError, TypeError, KeyError) as e:
+                            logger.warning(f"Ignoring text message: {e}")
+                            continue
+                        if skipped > 0:
+                            engine.add_gap(skipped)
+                            skipped_seconds.inc(skipped / config.sample_rate)
+                        continue
+                    ingested_bytes.inc(len(data))
+                    # logger.info(f"received {len(data)} bytes")
+
+                    if codec == "pcm":
+                        # odd trailing bytes are carried over inside the buffer
+                        engine.append_pcm(data)
+                    else:
+                        # off the event loop; packets still land in order
+                        with trace.span("decode", 2):
+                            engine.append(await decode_audio(data, codec))
+                    if max_pending and engine.pending() > max_pending:
+                        raise SessionOverloaded(f"{engine.pending() / config.sample_rate:.1f}s of audio pending")
+                    received.set()
+            finally:
+                received.set()
+
+        reader = asyncio.create_task(receive_audio())
+        while True:
+            await received.wait()
+            received.clear()
+            if reader.done():
+                reader.result()  # re-raises the disconnect or overload
+
+            async for event in engine.process():
+                if event.kind == StreamEvent.SPEECH:
                     #返回说话人
-                    if sv:
-                        # speaker verify
-                        # If no hit is detected, continue accumulating audio data and check again until a hit is detected
-                        # `hit` will reset after `asr`.
-                        if not hit:
-                            hit, speaker = speaker_verify(audio_vad[int((last_vad_beg - offset) * config.sample_rate / 1000):], config.sv_thr)
-                            if hit:
-                                spk=speaker
-                                response = TranscriptionResponse(
-                                    code=2,
-                                    info="detect speaker",
-                                    data=speaker
-                                )
-
-                            else:
-                                spk='unknown'
-                                response = TranscriptionResponse(
-                                    code=2,
-                                    info="detect speech",
-                                    data='unknown'
-                                )
-                        await websocket.send_json(response.model_dump())
-
-                res = model_vad.generate(input=chunk, cache=cache, is_final=False, chunk_size=config.chunk_size_ms)
-                # logger.info(f"vad inference: {res}")
-                if len(res[0]["value"]):
-                    vad_segments = res[0]["value"]
-                    for segment in vad_segments:
-                        if segment[0] > -1: # speech begin
-                            last_vad_beg = segment[0]                           
-                        if segment[1] > -1: # speech end
-                            last_vad_end = segment[1]
-                        if last_vad_beg > -1 and last_vad_end > -1:
-                            last_vad_beg -= offset
-                            last_vad_end -= offset
-                            offset += last_vad_end
-                            beg = int(last_vad_beg * config.sample_rate / 1000)
-                            end = int(last_vad_end * config.sample_rate / 1000)
-                            logger.info(f"[vad segment] audio_len: {end - beg}")
-                            #result = None if sv and not hit else asr(audio_vad[beg:end], lang.strip(), cache_asr, True)
-                            result = asr(audio_vad[beg:end], lang.strip(), cache_asr, True)
-                            logger.info(f"asr response: {result}")
-                            audio_vad = audio_vad[end:]
-                            last_vad_beg = last_vad_end = -1
-                            hit = False
-                            
-                            if  result is not None:
-                                result[0]['speaker']=spk
-                                response = TranscriptionResponse(
-                                    code=0,
-                                    info=json.dumps(result[0], ensure_ascii=False),
-                                    data=format_str_v3(result[0]['text'])
-                                )
-                                await websocket.send_json(response.model_dump())
-                                # if hit:
-                                #     response = TranscriptionResponse(
-                                #         code=0,
-                                #         info="transcription result",
-                                #         data=speaker+format_str_v3(result[0]['text'])
-                                #     )
-                                # else:
-                                #     # 如果无法识别说话人，则返回 unknown:{text}
-                                #     response = TranscriptionResponse(
-                                #         code=0,
-                                #         info="transcription result",
-                                #         data='unknown'+format_str_v3(result[0]['text'])
-                                #     )
-                        # logger.debug(f'last_vad_beg: {last_vad_beg}; last_vad_end: {last_vad_end} len(audio_vad): {len(audio_vad)}')
+                    if event.hit:
+                        await send(encoder.event("detect speaker", event.speaker))
+                    else:
+                        await send(encoder.event("detect speech", 'unknown'))
+                elif event.result is not None:
+                    # format_str_v3 and the wire encoding
+                    with trace.span("format"):
+                        message = encoder.result(0, event.result, event.speaker, event.start, event.end)
+                    await send(message)
 
     except WebSocketDisconnect:
         logger.info("WebSocket disconnected")
+    except AudioDecodeError as e:
+        logger.warning(f"Closing WebSocket: {e}")
+        await websocket.close(code=1007, reason=str(e))
+    except SessionOverloaded as e:
+        logger.warning(f"Closing overloaded WebSocket: {e}")
+        overloaded_sessions.inc()
+        await websocket.close(code=1013, reason=f"{e}; retry-after={admission.retry_after_s}")
     except Exception as e:
         logger.error(f"Unexpected error: {e}\nCall stack:\n{traceback.format_exc()}")
         await websocket.close()
     finally:
-        audio_buffer = np.array([], dtype=np.float32)
-        audio_vad = np.array([], dtype=np.float32)
-        cache.clear()
+        active_sessions.dec()
+        admission.release()
+        if reader is not None:
+            reader.cancel()
+        if engine is not None:
+            engine.close()
         logger.info("Cleaned up resources after WebSocket disconnect")
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run the FastAPI app with a specified port.")
     parser.add_argument('--port', type=int, default=8888, help='Port number to run the FastAPI app on.')
+    parser.add_argument('--workers', type=int, default=1, help='Number of forked worker processes sharing the loaded models (CPU only).')
+    parser.add_argument('--intra-op-threads', type=int, default=0, help='Torch intra-op threads per worker (default: CPUs / workers).')
+    parser.add_argument('--inter-op-threads', type=int, default=1, help='Torch inter-op threads per worker.')
+    parser.add_argument('--pin-cpus', action='store_true', help='Pin each worker to its own set of CPUs.')
+    parser.add_argument('--rss-interval', type=int, default=60, help='Seconds between per-worker memory reports.')
     # parser.add_argument('--certfile', type=str, default='path_to_your_SSL_certificate_file.crt', help='SSL certificate file')
     # parser.add_argument('--keyfile', type=str, default='path_to_your_SSL_certificate_file.key', help='SSL key file')
     args = parser.parse_args()
     # uvicorn.run(app, host="0.0.0.0", port=args.port, ssl_certfile=args.certfile, ssl_keyfile=args.keyfile)
-    uvicorn.run(app, host="127.0.0.1", port=args.port)
+    if args.workers > 1:
+        # build the models once here so the forked workers share them;
+        # ONNX Runtime stages are built in each worker instead
+        models.load([s for s in models.STAGES if models.enabled(s) and models.fork_safe(s)])
+        serve_workers(app, "127.0.0.1", args.port, args.workers,
+                      intra_threads=args.intra_op_threads, inter_threads=args.inter_op_threads,
+                      pin_cpus=args.pin_cpus, report_interval=args.rss_interval)
+    else:
+        uvicorn.run(app, host="127.0.0.1", port=args.port)
@@ -0,0 +1,214 @@
+import json
+import os
+import tempfile
+import threading
+
+import numpy as np
+import soundfile as sf
+from loguru import logger
+
+DEFAULT_INDEX_PATH = "speaker/.sv_index"
+
+
+def normalize(embs):
+    embs = np.asarray(embs, dtype=np.float32)
+    norm = np.linalg.norm(embs, axis=-1, keepdims=True)
+    return embs / np.maximum(norm, 1e-12)
+
+
+def extract_embeddings(sv_pipeline, audios):
+    """Run the SV model once over `audios`; one L2-normalised row per input."""
+    audios = list(audios)
+    res = sv_pipeline(audios, output_emb=True)
+    return normalize(np.asarray(res["embs"], dtype=np.float32).reshape(len(audios), -1))
+
+
+def enrollment_files(files):
+    """Expand `files` into (speaker, path) pairs.
+
+    A plain file enrolls a speaker named after the file; a directory
+    enrolls one speaker named after the directory from all WAVs inside.
+    """
+    for f in files:
+        if os.path.isdir(f):
+            name = os.path.basename(os.path.normpath(f))
+            for w in sorted(os.listdir(f)):
+                if w.endswith(".wav"):
+                    yield name, os.path.join(f, w)
+        else:
+            name, _ = os.path.splitext(os.path.basename(f))
+            yield name, f
+
+
+class SpeakerIndex:
+    """Enrolled speakers as a matrix of unit-norm centroids.
+
+    `match` scores a query embedding against every speaker with a single
+    matrix-vector product, so the cost does not depend on how many
+    speakers are enrolled.
+    """
+
+    def __init__(self, names, centroids):
+        self.names = list(names)
+        if self.names:
+            self.centroids = normalize(np.asarray(centroids, dtype=np.float32).reshape(len(self.names), -1))
+        else:
+            self.centroids = np.zeros((0, 1), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.names)
+
+    def scores(self, emb):
+        return self.centroids @ normalize(emb).reshape(-1)
+
+    def match(self, emb):
+        """Return (speaker, cosine score) of the best match."""
+        if not self.names:
+            return None, -1.0
+        scores = self.scores(emb)
+        i = int(np.argmax(scores))
+        return self.names[i], float(scores[i])
+
+    @classmethod
+    def from_embeddings(cls, names, embs):
+        """Average per-file embeddings into one centroid per speaker."""
+        groups = {}
+        for name, emb in zip(names, embs):
+            groups.setdefault(name, []).append(emb)
+        return cls(groups, [np.mean(v, axis=0) for v in groups.values()])
+
+    @classmethod
+    def load_or_build(cls, files, embed, path=DEFAULT_INDEX_PATH):
+        """Build an index for `files`, reusing embeddings stored at `path`.
+
+        Per-file embeddings are persisted as `<path>.npy` (opened
+        memory-mapped) plus a `<path>.json` manifest keyed by file path
+        and mtime. Only new or modified files go through `embed`, which
+        maps a list of float32 arrays to an (n, dim) embedding matrix.
+        """
+        entries, matrix = load_store(path)
+        rows = {(e["path"], e["mtime"]): i for i, e in enumerate(entries)}
+
+        pairs = list(enrollment_files(files))
+        keys = [(os.path.abspath(f), os.path.getmtime(f)) for _, f in pairs]
+        missing = [i for i, k in enumerate(keys) if k not in rows]
+        if missing:
+            audios = [sf.read(pairs[i][1], dtype="float32")[0] for i in missing]
+            new = normalize(embed(audios))
+            logger.info(f"[speaker_index] embedded {len(missing)} enrollment file(s)")
+            entries = entries + [{"path": keys[i][0], "mtime": keys[i][1]} for i in missing]
+            # Rebinding `matrix` drops the last reference to the mapped
+            # store, which Windows will not replace while it is mapped.
+            matrix = new if matrix is None else np.concatenate([matrix, new])
+            save_store(path, entries, matrix)
+            rows = {(e["path"], e["mtime"]): i for i, e in enumerate(entries)}
+
+        if not pairs:
+            return cls([], [])
+        embs = matrix[[rows[k] for k in keys]]
+        return cls.from_embeddings([name for name, _ in pairs], embs)
+
+
+class SpeakerRegistry:
+    """Speaker index for one recognition session, (re)built off-thread.
+
+    `load` and `add` hand the file list to a background thread that
+    builds a new `SpeakerIndex` and swaps it in; readers only ever take
+    the current `index`, so the capture loop never touches the disk.
+    Until the first load finishes the index is empty.
+    """
+
+    def __init__(self, embed, path=DEFAULT_INDEX_PATH):
+        self._embed = embed
+        self._path = path
+        self._files = []
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._version = 0
+        self._loaded = 0
+        self.index = SpeakerIndex([], [])
+
+    def load(self, files):
+        with self._lock:
+            self._files = list(files)
+            self._version += 1
+        self._start()
+
+    def add(self, file):
+        with self._lock:
+            # a re-recorded file keeps its path but gets a new mtime,
+            # so it is rebuilt either way
+            if file not in self._files:
+                self._files.append(file)
+            self._version += 1
+        self._start()
+
+    def _start(self):
+        threading.Thread(target=self._build, daemon=True).start()
+
+    def _build(self):
+        with self._build_lock:
+            with self._lock:
+                files, version = list(self._files), self._version
+            try:
+                index = SpeakerIndex.load_or_build(files, self._embed, self._path)
+            except Exception as e:
+                logger.error(f"[speaker_index] failed to load {files}: {e}")
+                return
+            with self._lock:
+                # a newer request may already have finished
+                if version >= self._loaded:
+                    self._loaded = version
+                    self.index = index
+            logger.info(f"[speaker_index] loaded speakers: {index.names}")
+
+
+def load_store(path):
+    """Return the (entries, embeddings) persisted at `path`, or ([], None)."""
+    try:
+        with open(path + ".json", encoding="utf-8") as f:
+            entries = json.load(f)
+        matrix = np.load(path + ".npy", mmap_mode="r")
+    except (OSError, ValueError):
+        return [], None
+    if len(entries) != len(matrix):
+        logger.warning(f"[speaker_index] {path} is inconsistent, rebuilding")
+        return [], None
+    return entries, matrix
+
+
+def save_store(path, entries, matrix):
+    # Entries whose file no longer exists or was re-recorded are dropped
+    # so the store does not grow without bound.
+    keep = [i for i, e in enumerate(entries)
+            if os.path.exists(e["path"]) and os.path.getmtime(e["path"]) == e["mtime"]]
+    entries = [entries[i] for i in keep]
+    matrix = np.ascontiguousarray(matrix[keep], dtype=np.float32)
+
+    # Unique temp names: every worker process may save at startup.
+    folder = os.path.dirname(path) or "."
+    os.makedirs(folder, exist_ok=True)
+    tmp = []
+    try:
+        fd, tmp_npy = tempfile.mkstemp(suffix=".npy", dir=folder)
+        tmp.append(tmp_npy)
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, matrix)
+        fd, tmp_json = tempfile.mkstemp(suffix=".json", dir=folder)
+        tmp.append(tmp_json)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False)
+        os.replace(tmp_npy, path + ".npy")
+        tmp.remove(tmp_npy)
+        os.replace(tmp_json, path + ".json")
+        tmp.remove(tmp_json)
+    except OSError as e:
+        # e.g. another process still has the old store mapped (Windows);
+        # the store is only a cache, so the next load re-embeds instead.
+        logger.warning(f"[speaker_index] could not save {path}: {e}")
+    finally:
+        for f in tmp:
+            try:
+                os.remove(f)
+            except OSError:
+                pass
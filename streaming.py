@@ -0,0 +1,199 @@
+import asyncio
+import inspect
+
+import numpy as np
+from loguru import logger
+
+from audio_buffer import AudioRingBuffer, GapMap
+from segmentation import SegmentationPolicy
+from sv_scheduler import SpeakerScheduler
+from tracing import NULL_TRACE
+
+
+class StreamEvent:
+    """What a `StreamingRecognizer` reports; `start` / `end` are ms on the
+    sender's clock (skipped gaps included)."""
+
+    SPEECH = "speech"   # a chunk of open speech went by (only with SV on)
+    FINAL = "final"     # a segment was decoded; `result` is None if it was too short
+
+    __slots__ = ("kind", "result", "speaker", "hit", "start", "end")
+
+    def __init__(self, kind, result=None, speaker="unknown", hit=False, start=None, end=None):
+        self.kind = kind
+        self.result = result
+        self.speaker = speaker
+        self.hit = hit
+        self.start = start
+        self.end = end
+
+    def __repr__(self):
+        return (f"StreamEvent({self.kind!r}, result={self.result!r}, speaker={self.speaker!r}, hit={self.hit}, "
+                f"start={self.start}, end={self.end})")
+
+
+async def _call(fn, *args):
+    # hooks may be plain functions (the GUIs) or coroutines (the server's batchers)
+    result = fn(*args)
+    return await result if inspect.isawaitable(result) else result
+
+
+class StreamingRecognizer:
+    """The chunk -> VAD -> SV -> ASR loop of one audio stream.
+
+    PCM goes in with `append_pcm` / `append` (and silence the sender left
+    out with `add_gap`); `process` runs streaming VAD over every complete
+    `chunk_size_ms` chunk and yields `StreamEvent`s. Inference is done by
+    the hooks, which may be plain functions or coroutine functions:
+
+        vad(chunk, cache) -> fsmn-vad streaming result
+        asr(samples) -> one SenseVoice result dict (final decodes)
+        embed(samples) -> speaker embedding; None disables SV
+        match(emb) -> (hit, speaker) against the enrolled speakers
+        has_speakers() -> whether anyone is enrolled yet
+
+    Audio lives in one `AudioRingBuffer` addressed by absolute sample
+    index, so VAD timestamps map onto it directly; only `lookback_ms` is
+    kept while no speech is open. `speakers` schedules SV attempts,
+    `segmentation` cuts over-long segments, `diarizer` labels segments no
+    enrolled speaker claims, `partials` (a PartialTranscriber) decodes
+    interim results, and `shed_sv()` skips optional SV under load.
+    """
+
+    def __init__(self, vad, asr, embed=None, match=None, has_speakers=None, sample_rate=16000, chunk_size_ms=300,
+                 lookback_ms=2000, segmentation=None, speakers=None, diarizer=None, partials=None, shed_sv=None,
+                 trace=NULL_TRACE):
+        self.vad = vad
+        self.asr = asr
+        self.embed = embed
+        self.match = match
+        self.has_speakers = has_speakers or (lambda: True)
+        self.sample_rate = sample_rate
+        self.chunk_size_ms = chunk_size_ms
+        self.chunk_size = int(chunk_size_ms * sample_rate / 1000)
+        self.lookback = int(lookback_ms * sample_rate / 1000)
+        self.segmentation = segmentation or SegmentationPolicy(sample_rate=sample_rate)
+        self.speakers = speakers or SpeakerScheduler(sample_rate)
+        self.diarizer = diarizer
+        self.partials = partials
+        self.shed_sv = shed_sv or (lambda: False)
+        self.trace = trace
+
+        self.audio = AudioRingBuffer()
+        self.gaps = GapMap()
+        self.vad_pos = 0            # end of the audio VAD has seen
+        self.cache = {}             # streaming VAD state
+        self.beg = -1               # open segment start (ms), -1 if none
+        self.hit = False
+        self.speaker = "unknown"    # speaker of the open segment so far
+        # fsmn-vad copies each chunk into its cache during the call, so
+        # one scratch buffer serves every chunk of the stream.
+        self._chunk = np.empty(self.chunk_size, dtype=np.float32)
+
+    @classmethod
+    def from_config(cls, config, vad, asr, sample_rate=None, chunk_size_ms=None, **kwargs):
+        sample_rate = sample_rate or config.sample_rate
+        kwargs.setdefault("segmentation", SegmentationPolicy.from_config(config, sample_rate))
+        kwargs.setdefault("speakers", SpeakerScheduler.from_config(config, sample_rate))
+        return cls(vad, asr, sample_rate=sample_rate, chunk_size_ms=chunk_size_ms or config.chunk_size_ms,
+                   lookback_ms=config.vad_lookback_ms, **kwargs)
+
+    def append_pcm(self, data):
+        """Append raw little-endian int16 PCM; odd bytes carry over."""
+        self.audio.append_pcm(data)
+
+    def append(self, samples):
+        self.audio.append(samples)
+
+    def add_gap(self, samples):
+        """The sender skipped `samples` of silence at this point."""
+        self.gaps.add(self.audio.end, samples, forget_before=self.audio.start)
+
+    def pending(self):
+        """Samples received but not yet through VAD."""
+        return self.audio.end - self.vad_pos
+
+    def ms(self, pos):
+        return self.gaps.to_stream(pos) * 1000 // self.sample_rate
+
+    def _pos(self, ms):
+        return int(ms * self.sample_rate / 1000)
+
+    async def process(self):
+        """Run every complete chunk received so far; yields StreamEvents."""
+        trace = self.trace
+        while self.audio.end - self.vad_pos >= self.chunk_size:
+            chunk = self.audio.float32(self.vad_pos, self.vad_pos + self.chunk_size, out=self._chunk)
+            self.vad_pos += self.chunk_size
+            if self.beg == -1:
+                # No speech open: only keep enough history for a look-back
+                # VAD start.
+                self.audio.discard_until(self.vad_pos - self.lookback)
+
+            if self.beg > -1 and self.embed is not None:
+                # `speakers` decides when to verify and on which recent
+                # window; the result holds until the segment ends.
+                seg_beg = self._pos(self.beg)
+                if self.has_speakers() and self.speakers.due(seg_beg, self.vad_pos) and not self.shed_sv():
+                    lo, hi = self.speakers.window_for(seg_beg, self.vad_pos)
+                    with trace.span("sv", attempt=self.speakers.attempts):
+                        emb = await _call(self.embed, self.audio.float32(lo, hi))
+                        self.hit, speaker = self.speakers.update(emb, self.match)
+                    self.speaker = speaker if self.hit else "unknown"
+                yield StreamEvent(StreamEvent.SPEECH, speaker=self.speaker, hit=self.hit)
+
+            with trace.span("vad"):
+                res = await _call(self.vad, chunk, self.cache)
+            end_ms = -1
+            for seg_beg, seg_end in res[0]["value"]:
+                if seg_beg > -1:  # speech begin
+                    self.beg = seg_beg
+                if seg_end > -1:  # speech end
+                    end_ms = seg_end
+                if self.beg > -1 and end_ms > -1:
+                    event = await self._finalize(self._pos(self.beg), self._pos(end_ms))
+                    self.beg = end_ms = -1
+                    self.hit = False
+                    self.speaker = "unknown"
+                    self.speakers.new_segment()
+                    yield event
+
+            if self.beg > -1:
+                cut = self.segmentation.forced_cut(self.audio, self._pos(self.beg), self.vad_pos)
+                if cut is not None:
+                    # Decode up to the cut; the segment stays open from
+                    # there, so the VAD end that follows still lines up.
+                    event = await self._finalize(self._pos(self.beg), cut)
+                    self.beg = cut * 1000 / self.sample_rate
+                    yield event
+
+            if self.partials is not None and self.beg > -1:
+                self.partials.poll(self.audio, self._pos(self.beg), self.vad_pos)
+
+    async def _finalize(self, beg, end):
+        logger.info(f"[vad segment] audio_len: {end - beg}")
+        if self.partials is not None:
+            self.partials.close()
+        event = StreamEvent(StreamEvent.FINAL, speaker=self.speaker, hit=self.hit, start=self.ms(beg), end=self.ms(end))
+        if self.segmentation.too_short(beg, end):
+            self.audio.discard_until(end)
+            return event
+        samples = self.audio.float32(beg, end)
+        seconds = (end - beg) / self.sample_rate
+        if (self.diarizer is not None and self.embed is not None and not self.hit
+                and end - beg >= self.speakers.min_len and not self.shed_sv()):
+            # one embedding of the whole segment, computed alongside ASR
+            with self.trace.span("asr+sv", seconds=seconds):
+                event.result, emb = await asyncio.gather(_call(self.asr, samples), _call(self.embed, samples))
+            event.speaker = self.diarizer.assign(emb)
+        else:
+            with self.trace.span("asr", seconds=seconds):
+                event.result = await _call(self.asr, samples)
+        logger.info(f"asr response: {event.result}")
+        self.audio.discard_until(end)
+        return event
+
+    def close(self):
+        if self.partials is not None and self.partials.task is not None:
+            self.partials.task.cancel()
+        self.cache.clear()
@@ -0,0 +1,68 @@
+import numpy as np
+
+
+class SpeakerScheduler:
+    """When a session runs speaker verification, and on how much audio.
+
+    Per segment, the first attempt waits for `min_audio_s` of speech,
+    later ones for `interval_s` more, and there are at most
+    `max_attempts`. Each attempt embeds only the last `window_s` seconds,
+    so its cost does not grow with the utterance. Once a segment is
+    decided (a hit, or out of attempts) its result is the session's
+    anchor: a later segment whose first embedding has cosine similarity
+    of at least `sticky_thr` to the anchor embedding keeps that speaker
+    without matching the enrolled index; lower similarity is treated as
+    a speaker change and verified in full. All positions are absolute
+    sample indices.
+    """
+
+    def __init__(self, sample_rate=16000, min_audio_s=1.0, interval_s=1.0, max_attempts=3, window_s=3.0,
+                 sticky_thr=0.8):
+        self.min_len = int(min_audio_s * sample_rate)
+        self.interval = max(int(interval_s * sample_rate), 1)
+        self.max_attempts = max_attempts
+        self.window = int(window_s * sample_rate)
+        self.sticky_thr = sticky_thr
+        self.anchor = None          # embedding of the last full verification
+        self.anchor_result = (False, None)
+        self.new_segment()
+
+    @classmethod
+    def from_config(cls, config, sample_rate=None):
+        return cls(sample_rate or config.sample_rate, config.sv_min_audio_s, config.sv_interval_s,
+                   config.sv_max_attempts, config.sv_window_s, config.sv_sticky_thr)
+
+    def new_segment(self):
+        self.decided = False
+        self.attempts = 0
+        self.next_pos = None
+
+    def due(self, beg, pos):
+        """Whether an attempt should run for the segment [beg, pos)."""
+        if self.decided or self.attempts >= self.max_attempts:
+            return False
+        if self.next_pos is None:
+            self.next_pos = beg + self.min_len
+        return pos >= self.next_pos
+
+    def window_for(self, beg, pos):
+        """Count an attempt and return the (lo, hi) range to embed."""
+        self.attempts += 1
+        self.next_pos = pos + self.interval
+        return max(beg, pos - self.window if self.window > 0 else beg), pos
+
+    def update(self, emb, verify):
+        """Score an attempt's embedding; returns (hit, speaker).
+
+        `verify(emb)` matches against the enrolled speakers and is only
+        called when the speaker may have changed since the anchor.
+        """
+        if self.attempts == 1 and self.anchor is not None and float(np.dot(emb, self.anchor)) >= self.sticky_thr:
+            self.decided = True
+            return self.anchor_result
+        hit, speaker = verify(emb)
+        if hit or self.attempts >= self.max_attempts:
+            self.decided = True
+            self.anchor = emb
+            self.anchor_result = (hit, speaker)
+        return hit, speaker
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from audio_buffer import AudioRingBuffer
+
+
+@pytest.mark.parametrize("sizes", [
+    [3, 0, 1],
+    [0, 0, 2],
+    [1, 0, 0, 1, 5, 0, 7],
+    [1023, 1, 0, 1024, 3],
+])
+def test_append_pcm_empty_and_odd_packets(sizes):
+    pcm = np.arange(1, 1 + sum(sizes)).astype(np.uint8).tobytes()
+    audio = AudioRingBuffer(capacity=4)
+    pos = 0
+    for size in sizes:
+        audio.append_pcm(pcm[pos:pos + size])
+        pos += size
+    expected = np.frombuffer(pcm[:len(pcm) & ~1], dtype=np.int16)
+    assert np.array_equal(audio.view(0), expected)
+
+
+def test_append_pcm_random_packets():
+    rng = np.random.default_rng(0)
+    pcm = rng.integers(0, 256, 20000, dtype=np.uint8).tobytes()
+    audio = AudioRingBuffer(capacity=16)
+    pos = 0
+    while pos < len(pcm):
+        size = int(rng.integers(0, 9))
+        audio.append_pcm(pcm[pos:pos + size])
+        pos += size
+    assert np.array_equal(audio.view(0), np.frombuffer(pcm[:len(pcm) & ~1], dtype=np.int16))
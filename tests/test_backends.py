@@ -0,0 +1,53 @@
+import sys
+import types
+
+import numpy as np
+import pytest
+
+import backends
+from config import Config
+
+
+class FakeSenseVoiceSmall:
+    """Mirrors funasr_onnx 0.4.3 `SenseVoiceSmall.__call__` input handling:
+    a str is a path, an ndarray is audio, list elements are paths."""
+
+    calls = []
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __call__(self, wav_content, language="auto", textnorm="woitn"):
+        self.calls.append((wav_content, language, textnorm))
+        if isinstance(wav_content, np.ndarray):
+            return [f"len{len(wav_content)}"]
+        if isinstance(wav_content, (str, list)):
+            paths = [wav_content] if isinstance(wav_content, str) else wav_content
+            return [path.lower() for path in paths]  # load_wav(path); fails for ndarrays
+        raise TypeError(f"unsupported input {type(wav_content)}")
+
+
+@pytest.fixture
+def onnx_asr(monkeypatch):
+    monkeypatch.setitem(sys.modules, "funasr_onnx", types.SimpleNamespace(SenseVoiceSmall=FakeSenseVoiceSmall))
+    FakeSenseVoiceSmall.calls = []
+    return backends.OnnxSenseVoice(Config(backend="onnx"))
+
+
+def test_sensevoice_gets_one_ndarray_per_call(onnx_asr):
+    audios = [np.zeros(1600, dtype=np.float32), np.zeros(3200, dtype=np.float64)]
+    res = onnx_asr.generate(input=audios, language="zh", use_itn=True)
+
+    assert [r["text"] for r in res] == ["len1600", "len3200"]
+    assert len(FakeSenseVoiceSmall.calls) == 2
+    for (wav, language, textnorm), audio in zip(FakeSenseVoiceSmall.calls, audios):
+        assert type(wav) is np.ndarray and wav.dtype == np.float32 and len(wav) == len(audio)
+        assert (language, textnorm) == ("zh", "withitn")
+
+
+def test_sensevoice_single_input(onnx_asr):
+    res = onnx_asr.generate(input=np.zeros(800, dtype=np.float32))
+
+    assert [r["text"] for r in res] == ["len800"]
+    wav, language, textnorm = FakeSenseVoiceSmall.calls[0]
+    assert type(wav) is np.ndarray and (language, textnorm) == ("auto", "woitn")
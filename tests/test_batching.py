@@ -0,0 +1,54 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from batching import MicroBatcher
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def submit_all(batcher, audios):
+    return await asyncio.gather(*(batcher.submit(a) for a in audios), return_exceptions=True)
+
+
+def test_failing_input_only_fails_its_own_request():
+    calls = []
+
+    def run_batch(key, audios):
+        calls.append(len(audios))
+        if any(len(a) == 1 for a in audios):
+            raise ValueError("too short")
+        return [len(a) for a in audios]
+
+    batcher = MicroBatcher(run_batch, max_wait_ms=50)
+    results = run(submit_all(batcher, [np.zeros(5), np.zeros(1), np.zeros(7)]))
+    assert results[0] == 5 and results[2] == 7
+    assert isinstance(results[1], ValueError)
+    assert calls == [3, 1, 1, 1]
+
+
+def test_missing_results_fail_instead_of_hanging():
+    batcher = MicroBatcher(lambda key, audios: [len(audios[0])], max_wait_ms=50)
+
+    async def main():
+        return await asyncio.wait_for(submit_all(batcher, [np.zeros(3), np.zeros(4)]), 5)
+
+    results = run(main())
+    assert results[0] == 3
+    assert isinstance(results[1], RuntimeError)
+
+
+def test_single_failure_is_not_retried():
+    calls = []
+
+    def run_batch(key, audios):
+        calls.append(len(audios))
+        raise ValueError("bad")
+
+    batcher = MicroBatcher(run_batch, max_wait_ms=1)
+    with pytest.raises(ValueError):
+        run(batcher.submit(np.zeros(2)))
+    assert calls == [1]
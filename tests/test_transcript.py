@@ -0,0 +1,31 @@
+import threading
+
+from transcript import TranscriptModel
+
+
+def test_drain_and_recent_lines():
+    model = TranscriptModel(max_lines=3, recent_lines=2)
+    assert model.drain() == (None, None)
+    for i in range(5):
+        model.append(str(i))
+    assert model.drain() == (["2", "3", "4"], ["3", "4"])
+    assert model.drain() == (None, None)
+    assert model.recent_lines() == ["3", "4"]
+
+
+def test_recent_lines_while_appending():
+    model = TranscriptModel(recent_lines=50)
+    stop = threading.Event()
+
+    def writer():
+        while not stop.is_set():
+            model.append("line")
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        for _ in range(2000):
+            assert len(model.recent_lines()) <= 50
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,156 @@
+import asyncio
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class NullTrace:
+    """Stand-in for sessions that are not traced: `span` returns one
+    shared no-op context manager, so instrumented code allocates nothing."""
+
+    id = None
+    enabled = False
+
+    def span(self, name, tid=0, **args):
+        return _NULL_SPAN
+
+
+NULL_TRACE = NullTrace()
+
+
+class _Span:
+    __slots__ = ("trace", "name", "tid", "args", "start")
+
+    def __init__(self, trace, name, tid, args):
+        self.trace = trace
+        self.name = name
+        self.tid = tid
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add(self.name, self.start, time.perf_counter_ns(), self.tid, self.args)
+        return False
+
+
+class SessionTrace:
+    """Spans of one session, exported as Chrome trace-event JSON
+    (chrome://tracing, Perfetto). `tid` separates concurrent tasks of
+    the session, named by `threads`. At most `max_events` are kept."""
+
+    enabled = True
+    _ids = itertools.count(1)
+
+    def __init__(self, name="session", max_events=100_000, threads=None):
+        self.id = f"{os.getpid()}-{next(self._ids)}"
+        self.name = name
+        self.threads = threads or {}
+        self.max_events = max_events
+        self.events = []
+        self.dropped = 0
+        self.started = time.perf_counter_ns()
+
+    def span(self, name, tid=0, **args):
+        return _Span(self, name, tid, args)
+
+    def add(self, name, start_ns, end_ns, tid=0, args=None):
+        if len(self.events) >= self.max_events:
+            self.dropped += 1
+            return
+        self.events.append((name, start_ns, end_ns, tid, args))
+
+    def export(self):
+        pid = os.getpid()
+        events = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+                   "args": {"name": f"{self.name} {self.id}"}}]
+        events += [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                   for tid, name in self.threads.items()]
+        for name, start, end, tid, args in self.events:
+            event = {"name": name, "ph": "X", "pid": pid, "tid": tid,
+                     "ts": (start - self.started) / 1000, "dur": (end - start) / 1000}
+            if args:
+                event["args"] = args
+            events.append(event)
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"dropped": self.dropped}}
+
+
+class TraceStore:
+    """The traces of live and recently finished sessions, newest last."""
+
+    def __init__(self, keep=32):
+        self.keep = keep
+        self._traces = OrderedDict()
+
+    def add(self, trace):
+        self._traces[trace.id] = trace
+        while len(self._traces) > self.keep:
+            self._traces.popitem(last=False)
+
+    def get(self, trace_id):
+        return self._traces.get(trace_id)
+
+    def ids(self):
+        return list(self._traces)
+
+
+class Profiler:
+    """Time-boxed cProfile / tracemalloc captures of the running process.
+
+    cProfile only sees the thread it runs on, i.e. the event loop:
+    inference in the executor threads shows up as time awaiting it.
+    tracemalloc covers every thread. One capture runs at a time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def busy(self):
+        return self._lock.locked()
+
+    async def cpu(self, seconds, top=50, sort="cumulative"):
+        with self._lock:
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profile.disable()
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats(sort).print_stats(top)
+        return out.getvalue()
+
+    async def memory(self, seconds, top=50, frames=10):
+        with self._lock:
+            started = not tracemalloc.is_tracing()
+            if started:
+                tracemalloc.start(frames)
+            try:
+                before = tracemalloc.take_snapshot()
+                await asyncio.sleep(seconds)
+                after = tracemalloc.take_snapshot()
+            finally:
+                if started:
+                    tracemalloc.stop()
+        lines = [f"allocations over {seconds}s, top {top} by size delta:"]
+        lines += [str(stat) for stat in after.compare_to(before, "lineno")[:top]]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,151 @@
+"""Transcribe an archive of audio files into a JSONL manifest.
+
+Files are sharded across `--procs` worker processes, each with its own
+fsmn-vad and SenseVoiceSmall (built through ModelRegistry, so Config /
+environment settings such as BACKEND and DEVICE apply). Every file is
+VAD-segmented in one offline pass and its segments are decoded in
+`batch_size_s` batches. One line per file is appended to the manifest:
+
+    {"path": ..., "duration_s": ..., "elapsed_s": ...,
+     "segments": [{"start": ms, "end": ms, "text": formatted, "raw": tags+text,
+                   "lang": ..., "emotion": ..., "events": [...]}, ...]}
+
+or {"path": ..., "error": ...} if it failed. Rerunning with the same
+manifest skips files already transcribed (failed ones are retried).
+
+    python transcribe_batch.py archive/ -o manifest.jsonl --procs 4 --threads 2
+    python transcribe_batch.py files.txt -o manifest.jsonl
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+
+from loguru import logger
+
+AUDIO_EXTS = (".wav", ".flac", ".ogg")
+
+_models = None
+_config = None
+
+
+def list_files(path):
+    """Audio files under directory `path`, or the paths listed in file `path`."""
+    if os.path.isdir(path):
+        return sorted(
+            os.path.join(root, f)
+            for root, _, names in os.walk(path)
+            for f in names if f.lower().endswith(AUDIO_EXTS)
+        )
+    if path.lower().endswith(AUDIO_EXTS):
+        return [path]
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def load_manifest(path):
+    """Return the paths already transcribed, dropping a torn last line."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end != len(data):
+            # the previous run died mid-write
+            f.truncate(end)
+    for line in data[:end].splitlines():
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        if "error" not in entry:
+            done.add(entry["path"])
+    return done
+
+
+def _init_worker(threads):
+    global _models, _config
+    from config import Config
+    from models import ModelRegistry
+
+    overrides = {"sv_enabled": False}
+    if threads:
+        overrides["intra_op_threads"] = threads
+    _config = Config(**overrides)
+    _models = ModelRegistry(_config)
+    _models.load(["vad", "asr"])
+
+
+def _transcribe(job):
+    path, lang = job
+    from offline import plan_batches, read_audio, vad_segments
+    from postprocess import parse_rich_text
+
+    start = time.perf_counter()
+    try:
+        audio = read_audio(path, target_rate=_config.sample_rate)
+        segments = vad_segments(_models.vad, audio, _config.sample_rate)
+        out = []
+        for batch in plan_batches(segments, _config.batch_size_s):
+            clips = [audio[beg * _config.sample_rate // 1000:end * _config.sample_rate // 1000] for beg, end in batch]
+            res = _models.asr.generate(input=clips, cache={}, language=lang, use_itn=True,
+                                       batch_size=len(clips), batch_size_s=_config.batch_size_s)
+            for (beg, end), r in zip(batch, res):
+                parsed = parse_rich_text(r["text"])
+                out.append({
+                    "start": beg, "end": end, "text": parsed["formatted"], "raw": r["text"],
+                    "lang": parsed["lang"], "emotion": parsed["emotion"], "events": parsed["events"],
+                })
+    except Exception as e:
+        return {"path": path, "error": f"{type(e).__name__}: {e}"}
+    return {
+        "path": path,
+        "duration_s": round(len(audio) / _config.sample_rate, 3),
+        "elapsed_s": round(time.perf_counter() - start, 3),
+        "segments": out,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcribe audio files into a resumable JSONL manifest.")
+    parser.add_argument("path", help="Directory to walk, a single audio file, or a text file listing paths")
+    parser.add_argument("-o", "--manifest", default="manifest.jsonl", help="JSONL manifest to append to")
+    parser.add_argument("--procs", type=int, default=1, help="Worker processes, each loading its own models")
+    parser.add_argument("--threads", type=int, default=0, help="intra_op_threads per worker (default: Config)")
+    parser.add_argument("--lang", default="auto")
+    parser.add_argument("--report-every", type=int, default=20, help="Log throughput every N files")
+    args = parser.parse_args()
+
+    files = list_files(args.path)
+    done = load_manifest(args.manifest)
+    todo = [f for f in files if f not in done]
+    logger.info(f"{len(files)} files; {len(files) - len(todo)} already in {args.manifest}; {len(todo)} to do")
+    if not todo:
+        return
+
+    # spawn, so no worker inherits a half-initialised CUDA or thread pool
+    ctx = multiprocessing.get_context("spawn")
+    start = time.perf_counter()
+    audio_s = 0.0
+    failed = 0
+    with open(args.manifest, "a", encoding="utf-8") as manifest, \
+            ctx.Pool(args.procs, initializer=_init_worker, initargs=(args.threads,)) as pool:
+        for n, entry in enumerate(pool.imap_unordered(_transcribe, [(f, args.lang) for f in todo]), 1):
+            manifest.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            manifest.flush()
+            os.fsync(manifest.fileno())
+            if "error" in entry:
+                failed += 1
+                logger.error(f"{entry['path']}: {entry['error']}")
+            else:
+                audio_s += entry["duration_s"]
+            if n % args.report_every == 0 or n == len(todo):
+                wall_s = time.perf_counter() - start
+                logger.info(f"{n}/{len(todo)} files; {failed} failed; {audio_s / 3600:.2f} audio hours; "
+                            f"{audio_s / wall_s:.1f} audio-hours per wall-hour")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import threading
+from collections import deque
+
+
+class TranscriptModel:
+    """Transcript lines handed from recognition threads to a GUI.
+
+    `append` may be called from any thread and never touches a widget.
+    The UI thread calls `drain` on a timer (at most `fps` times a second)
+    and renders everything new in one update, so the cost of a frame
+    depends on what arrived since the last one, not on the session
+    length. At most `max_lines` undrawn lines are kept, and the widget
+    keeps only the last `max_lines`; the last `recent_lines` are kept for
+    a subtitle overlay (`recent_lines()`).
+    """
+
+    def __init__(self, max_lines=2000, recent_lines=3, fps=10):
+        self.max_lines = max_lines
+        self.interval_ms = max(1000 // fps, 1)
+        self._recent = deque(maxlen=recent_lines)
+        self._pending = deque(maxlen=max_lines)
+        self._lock = threading.Lock()
+
+    def append(self, line):
+        with self._lock:
+            self._recent.append(line)
+            self._pending.append(line)
+
+    def drain(self):
+        """Return (lines added since the last call, recent lines), or
+        (None, None) if nothing changed."""
+        with self._lock:
+            if not self._pending:
+                return None, None
+            lines = list(self._pending)
+            self._pending.clear()
+            return lines, list(self._recent)
+
+    def recent_lines(self):
+        with self._lock:
+            return list(self._recent)
@@ -0,0 +1,128 @@
+import gc
+import os
+import signal
+import socket
+import time
+
+import uvicorn
+from loguru import logger
+
+
+def memory_kb(pid):
+    """Return (rss, pss) of `pid` in KiB.
+
+    RSS counts the copy-on-write model weights in every worker; PSS splits
+    shared pages between the processes mapping them and is the number to
+    size hosts with. Both are 0 where /proc is unavailable.
+    """
+    rss = pss = 0
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1])
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    pss = int(line.split()[1])
+    except OSError:
+        pass
+    return rss, pss
+
+
+def worker_cpus(index, threads):
+    """CPUs worker `index` is pinned to: `threads` consecutive allowed CPUs."""
+    cpus = sorted(os.sched_getaffinity(0))
+    return {cpus[(index * threads + i) % len(cpus)] for i in range(threads)}
+
+
+def setup_worker(index, intra_threads, inter_threads, pin_cpus):
+    import torch
+
+    torch.set_num_threads(intra_threads)
+    try:
+        torch.set_num_interop_threads(inter_threads)
+    except RuntimeError as e:
+        # only allowed before the first inter-op parallel region ran
+        logger.warning(f"[worker {index}] inter-op threads unchanged: {e}")
+    if pin_cpus:
+        os.sched_setaffinity(0, worker_cpus(index, intra_threads))
+    logger.info(f"[worker {index}] pid: {os.getpid()}; intra-op threads: {intra_threads}; "
+                f"inter-op threads: {inter_threads}; cpus: {sorted(os.sched_getaffinity(0))}")
+
+
+def serve_workers(app, host, port, workers, intra_threads=0, inter_threads=1, pin_cpus=False, report_interval=60):
+    """Serve `app` from `workers` forked processes sharing one socket.
+
+    The caller loads every model before calling this, so the weights are
+    inherited copy-on-write instead of being loaded once per worker.
+    Workers that exit unexpectedly are re-forked from the parent.
+    """
+    if not hasattr(os, "fork"):
+        raise RuntimeError("--workers needs os.fork (not available on this platform)")
+    import torch
+    if torch.cuda.is_available() and torch.cuda.is_initialized():
+        raise RuntimeError("--workers cannot fork after CUDA was initialised; run the models on CPU")
+    if intra_threads <= 0:
+        intra_threads = max(1, len(os.sched_getaffinity(0)) // workers)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    # Move everything allocated so far out of the collector's reach so
+    # collections in the workers don't write to (and un-share) its pages.
+    gc.collect()
+    gc.freeze()
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                setup_worker(index, intra_threads, inter_threads, pin_cpus)
+                uvicorn.Server(uvicorn.Config(app)).run(sockets=[sock])
+            finally:
+                os._exit(0)
+        return pid
+
+    children = {spawn(i): i for i in range(workers)}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    logger.info(f"serving on {host}:{port} with {workers} workers")
+
+    next_report = time.time()
+    while children:
+        if not stopping and time.time() >= next_report:
+            next_report = time.time() + report_interval
+            rss, pss = memory_kb(os.getpid())
+            logger.info(f"[workers] parent pid: {os.getpid()}; rss: {rss // 1024} MiB; pss: {pss // 1024} MiB")
+            for pid, index in sorted(children.items(), key=lambda c: c[1]):
+                rss, pss = memory_kb(pid)
+                logger.info(f"[workers] worker {index} pid: {pid}; rss: {rss // 1024} MiB; pss: {pss // 1024} MiB")
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            time.sleep(0.5)
+            continue
+        index = children.pop(pid, None)
+        if index is not None and not stopping:
+            logger.error(f"[workers] worker {index} (pid {pid}) exited with status {status}, restarting")
+            children[spawn(index)] = index
+    sock.close()